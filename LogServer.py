@@ -1,42 +1,610 @@
-from datetime import datetime
+from array import array
+import asyncio
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from datetime import datetime, timedelta
+from heapq import merge
+import json
+import math
+import mmap
+from operator import itemgetter
+import os
+import struct
+import sys
+import tempfile
 import time
 import random
-from threading import Lock
+from threading import Condition, Event, Lock, Thread, get_native_id, local
 
 class LogServer:
     _instance = None
     _lock = Lock()
+    SHARDS = 16  # Event shards in concurrent mode; threads beyond this share them
 
     def __new__(cls):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(LogServer, cls).__new__(cls)
-                cls._instance.log_entries = []
+                cls._instance._init_state()
             return cls._instance
 
+    def _init_state(self):
+        self.log_entries = []
+        # Open-process table: process_id -> index in log_entries of its running entry
+        self.open_entries = {}
+        self.log_file = "process_logs.txt"
+        self.query_index = None
+
+        # Streaming mode: completed entries are buffered in memory and a background
+        # flusher appends them in batches to a segment file instead of rewriting log_file
+        self.streaming = False
+        self.segment_file = "process_logs.segment"
+        self.batch_size = 1000
+        self.flush_interval = 1.0
+        self._buffer = []
+        self._buffer_cond = Condition()
+        self._write_lock = Lock()
+        self._flusher = None
+        self._segment_count = 0
+
+        # Concurrent mode: producer threads append events to one of a fixed set of deque shards,
+        # picked by thread id, and a single consumer drains the shards and merges them in time order
+        self.concurrent = False
+        self.drain_interval = 0.05
+        self._shards = [deque() for _ in range(self.SHARDS)]
+        self._local = local()
+        self._drain_lock = Lock()
+        self._early_ends = {}
+        self._consumer = None
+        self._consumer_stop = Event()
+
     def start_log(self, process_id, start_time):
-        self.log_entries.append((process_id, start_time, None))
+        if self.concurrent:
+            self._shard().append((start_time, 0, process_id))
+            return
+        self._record_start(process_id, start_time)
 
     def end_log(self, process_id, end_time):
-        for i, entry in enumerate(self.log_entries):
-            if entry[0] == process_id:
-                self.log_entries[i] = (process_id, entry[1], end_time)
-                break
-        
-        self.sort_and_write_to_file()
+        if self.concurrent:
+            self._shard().append((end_time, 1, process_id))
+            return
+        self._record_end(process_id, end_time)
+        if not self.streaming:
+            self.sort_and_write_to_file()
+
+    def _record_start(self, process_id, start_time):
+        self.open_entries[process_id] = len(self.log_entries)
+        self.log_entries.append((process_id, start_time, None))
+        if self.query_index is not None:
+            self.query_index.on_start(len(self.log_entries) - 1)
+
+    def _record_end(self, process_id, end_time):
+        # Closes the most recent run of process_id, so a restarted id never touches an earlier, already ended entry
+        i = self.open_entries.pop(process_id, None)
+        if i is None:
+            return None
+        completed = (process_id, self.log_entries[i][1], end_time)
+        self.log_entries[i] = completed
+        if self.query_index is not None:
+            self.query_index.on_end(i)
+
+        if self.streaming:
+            with self._buffer_cond:
+                self._buffer.append(completed)
+                if len(self._buffer) >= self.batch_size:
+                    self._buffer_cond.notify()
+        return completed
 
     def sort_and_write_to_file(self):
         sorted_entries = sorted(self.log_entries, key=lambda x: x[1])  # Sort by start_time
-        with open("process_logs.txt", "w") as f:
+        with open(self.log_file, "w") as f:
             for entry in sorted_entries:
-                process_id, start_time, end_time = entry
-                f.write(f"Process ID: {process_id}, Start Time: {start_time}, End Time: {end_time if end_time else 'Still running'}\n")
+                f.write(self._format_entry(entry))
+
+    @staticmethod
+    def _format_entry(entry):
+        process_id, start_time, end_time = entry
+        return f"Process ID: {process_id}, Start Time: {start_time}, End Time: {end_time if end_time else 'Still running'}\n"
+
+    def enable_streaming(self, segment_file="process_logs.segment", batch_size=1000, flush_interval=1.0):
+        """
+        Switches end_log to append-only mode. A batch is flushed to segment_file once
+        batch_size entries are pending or flush_interval seconds have passed.
+        """
+        self.segment_file = segment_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        if not self.streaming:
+            self.streaming = True
+            self._flusher = Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def disable_streaming(self):
+        with self._buffer_cond:
+            self.streaming = False
+            self._buffer_cond.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def _flush_loop(self):
+        while True:
+            with self._buffer_cond:
+                if self.streaming and len(self._buffer) < self.batch_size:
+                    self._buffer_cond.wait(self.flush_interval)
+                if not self.streaming:
+                    return
+                batch, self._buffer = self._buffer, []
+            self._append_to_segment(batch)
+
+    def flush(self):
+        with self._buffer_cond:
+            batch, self._buffer = self._buffer, []
+        self._append_to_segment(batch)
+
+    def _append_to_segment(self, batch):
+        if not batch:
+            return
+        with self._write_lock:
+            with open(self.segment_file, "a") as f:
+                f.write("".join(self._format_entry(entry) for entry in batch))
+
+    def rotate(self):
+        """
+        Flushes pending entries, seals the current segment as segment_file.<n>
+        and writes the sorted-by-start-time view to log_file.
+        """
+        self.flush()
+        with self._write_lock:
+            if os.path.exists(self.segment_file):
+                self._segment_count += 1
+                os.replace(self.segment_file, f"{self.segment_file}.{self._segment_count}")
+        self.sort_and_write_to_file()
+
+    def enable_queries(self):
+        if self.query_index is None:
+            self.query_index = LogQueryIndex(self)
+        return self.query_index
+
+    def to_columnar(self):
+        store = ColumnarLogStore()
+        for process_id, start_time, end_time in self.log_entries:
+            store.append(process_id, start_time, end_time)
+        return store
+
+    def enable_concurrent(self, drain_interval=0.05):
+        """
+        Switches start_log/end_log to sharded queues so producers never share a lock.
+        A consumer thread drains the shards every drain_interval seconds and appends the
+        runs they close to segment_file; the sorted log_file is written by rotate() or
+        when concurrent mode is disabled.
+        """
+        self.drain_interval = drain_interval
+        if not self.concurrent:
+            self.concurrent = True
+            self._consumer_stop.clear()
+            self._consumer = Thread(target=self._consume_loop, daemon=True)
+            self._consumer.start()
+
+    def disable_concurrent(self):
+        self._consumer_stop.set()
+        if self._consumer is not None:
+            self._consumer.join()
+            self._consumer = None
+        self.concurrent = False
+        self.drain()
+        if not self.streaming:
+            self.sort_and_write_to_file()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # Threads that share a shard still keep their own events in order, since deque.append is atomic
+            shard = self._local.shard = self._shards[get_native_id() % len(self._shards)]
+        return shard
+
+    def _consume_loop(self):
+        while not self._consumer_stop.wait(self.drain_interval):
+            self.drain()
+
+    def drain(self):
+        """
+        Applies every queued shard event to log_entries in time order and returns
+        the number of events applied.
+        """
+        with self._drain_lock:
+            batches = []
+            for shard in self._shards:
+                # deque.popleft is atomic, so producers keep appending while we drain
+                batch = []
+                try:
+                    while True:
+                        batch.append(shard.popleft())
+                except IndexError:
+                    pass
+                if batch:
+                    # Sorted by time alone: the sort is stable, so events logged in the same clock tick keep
+                    # the order their thread logged them in, and a restarted process closes each run in turn
+                    batch.sort(key=itemgetter(0))
+                    batches.append(batch)
+
+            completed = []
+            count = 0
+            for event_time, kind, process_id in merge(*batches, key=lambda event: event[:2]):
+                count += 1
+                if kind == 0:
+                    self._record_start(process_id, event_time)
+                    if process_id in self._early_ends:
+                        entry = self._record_end(process_id, self._early_ends.pop(process_id))
+                        if entry is not None:
+                            completed.append(entry)
+                else:
+                    entry = self._record_end(process_id, event_time)
+                    if entry is not None:
+                        completed.append(entry)
+                    else:
+                        # The start is still sitting in a shard that was drained before it arrived
+                        self._early_ends[process_id] = event_time
+
+            # Streaming mode already buffered these in _record_end; otherwise append them like it does
+            if not self.streaming:
+                self._append_to_segment(completed)
+            return count
+
+class LogQueryIndex:
+    """
+    Time-range and duration queries over LogServer.log_entries, maintained by
+    start_log/end_log. Starts and durations are kept sorted; an in-order start is appended
+    directly, anything else waits in a small buffer that the next query merges in, by insort
+    when it is short and by one sort after a burst of writes.
+
+    running_at looks up completed runs in an interval tree over rows: a segment tree whose
+    leaves are blocks of BLOCK rows and whose nodes hold the earliest start and latest end of
+    their completed runs. Rows are only appended and ends only change in place, so updates are
+    O(BLOCK + log n); rows arrive roughly in start order, so each node spans a narrow stretch of
+    time and a query only descends into nodes that can hold a run covering the moment. Open runs
+    are kept in a start-sorted list, and those started by the moment are a bisected prefix.
+    """
+    MAX_INSORT = 256  # Longest buffer merged by insort rather than a full sort
+    BLOCK = 32  # Rows per tree leaf, scanned directly once the tree narrows a query to them
+
+    def __init__(self, log_server):
+        self.log_server = log_server
+        self._starts = []  # (start_time, row) sorted by start_time
+        self._pending_starts = []
+        self._durations = []  # Completed durations, sorted
+        self._pending_durations = []
+        self._tree_size = 0  # Leaves in the tree; 0 until the first running_at builds it
+        self._min_start = []
+        self._max_end = []
+        self._dirty_rows = []  # Rows ended since the tree was last updated
+        self._open = []  # (start_time, row) of runs that have not ended, sorted by start_time
+        for row, entry in enumerate(log_server.log_entries):
+            self.on_start(row)  # Only runs still open join _open; the tree is built on first use
+            if entry[2] is not None:
+                self._pending_durations.append(entry[2] - entry[1])
+
+    def on_start(self, row):
+        start_time = self.log_server.log_entries[row][1]
+        if not self._pending_starts and (not self._starts or start_time >= self._starts[-1][0]):
+            self._starts.append((start_time, row))
+        else:
+            self._pending_starts.append((start_time, row))
+        if self.log_server.log_entries[row][2] is None:
+            insort(self._open, (start_time, row), key=itemgetter(0))
+
+    def on_end(self, row):
+        _, start_time, end_time = self.log_server.log_entries[row]
+        self._pending_durations.append(end_time - start_time)
+        self._dirty_rows.append(row)
+        i = bisect_left(self._open, start_time, key=itemgetter(0))
+        while self._open[i][1] != row:
+            i += 1
+        del self._open[i]
+
+    def _update_tree(self):
+        entries = self.log_server.log_entries
+        if not self._tree_size or len(entries) > self._tree_size * self.BLOCK:
+            self._build_tree()
+            return
+        size, min_start, max_end = self._tree_size, self._min_start, self._max_end
+        for block in {row // self.BLOCK for row in self._dirty_rows}:
+            node = size + block
+            min_start[node], max_end[node] = self._block_bounds(entries, block)
+            node //= 2
+            while node:
+                left, right = 2 * node, 2 * node + 1
+                start = min_start[left] if min_start[left] < min_start[right] else min_start[right]
+                end = max_end[left] if max_end[left] > max_end[right] else max_end[right]
+                if min_start[node] == start and max_end[node] == end:
+                    break  # Nothing above this node changes either
+                min_start[node] = start
+                max_end[node] = end
+                node //= 2
+        self._dirty_rows.clear()
+
+    def _block_bounds(self, entries, block):
+        completed = [entry for entry in entries[block * self.BLOCK:(block + 1) * self.BLOCK] if entry[2] is not None]
+        if not completed:
+            return datetime.max, datetime.min  # A leaf with no completed runs can never match a moment
+        return min(entry[1] for entry in completed), max(entry[2] for entry in completed)
+
+    def _build_tree(self):
+        # Rebuilt from log_entries with the leaf count doubled as needed, so growth is amortized O(1) per row
+        entries = self.log_server.log_entries
+        size = max(self._tree_size, 1)
+        while size * self.BLOCK < len(entries):
+            size *= 2
+        min_start = [datetime.max] * (2 * size)
+        max_end = [datetime.min] * (2 * size)
+        for block in range(-(-len(entries) // self.BLOCK)):
+            min_start[size + block], max_end[size + block] = self._block_bounds(entries, block)
+        for node in range(size - 1, 0, -1):
+            left, right = 2 * node, 2 * node + 1
+            min_start[node] = min_start[left] if min_start[left] < min_start[right] else min_start[right]
+            max_end[node] = max_end[left] if max_end[left] > max_end[right] else max_end[right]
+        self._tree_size, self._min_start, self._max_end = size, min_start, max_end
+        self._dirty_rows.clear()
+
+    def _merge(self, items, pending, key=None):
+        if len(pending) <= self.MAX_INSORT:
+            for item in pending:
+                insort(items, item, key=key)
+        else:
+            items.extend(pending)
+            items.sort(key=key)
+        pending.clear()
+
+    def _sort(self):
+        if self._pending_starts:
+            self._merge(self._starts, self._pending_starts, itemgetter(0))
+        if self._pending_durations:
+            self._merge(self._durations, self._pending_durations)
+
+    def started_between(self, start, end):
+        """
+        Entries whose start_time falls in [start, end), ordered by start_time.
+        """
+        self._sort()
+        lo = bisect_left(self._starts, start, key=itemgetter(0))
+        hi = bisect_left(self._starts, end, key=itemgetter(0))
+        entries = self.log_server.log_entries
+        return [entries[self._starts[i][1]] for i in range(lo, hi)]
+
+    def running_at(self, moment):
+        """
+        Entries with start_time <= moment that had not ended by moment.
+        """
+        self._update_tree()
+        entries = self.log_server.log_entries
+        size, min_start, max_end = self._tree_size, self._min_start, self._max_end
+        running = []
+        stack = [1]
+        while stack:
+            node = stack.pop()
+            if min_start[node] > moment or max_end[node] <= moment:
+                continue  # Every run here started after moment or ended by it
+            if node >= size:
+                first = (node - size) * self.BLOCK
+                for entry in entries[first:first + self.BLOCK]:
+                    if entry[2] is not None and entry[1] <= moment < entry[2]:
+                        running.append(entry)
+            else:
+                stack.append(2 * node + 1)
+                stack.append(2 * node)
+        for i in range(bisect_right(self._open, moment, key=itemgetter(0))):
+            running.append(entries[self._open[i][1]])
+        return running
+
+    def percentile(self, p):
+        """
+        Nearest-rank p-th percentile of completed durations, or None if nothing has ended.
+        """
+        self._sort()
+        if not self._durations:
+            return None
+        rank = max(1, math.ceil(p / 100 * len(self._durations)))
+        return self._durations[rank - 1]
+
+# Naive datetimes are stored as int64 nanoseconds since this epoch, which round-trips exactly
+EPOCH = datetime(1970, 1, 1)
+NO_END = -(2 ** 63)  # end_ns of a process that is still running
+
+def to_ns(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1) * 1000
+
+def from_ns(ns):
+    return EPOCH + timedelta(microseconds=ns // 1000)
+
+def _encode_id(process_id):
+    if isinstance(process_id, tuple):
+        return [_encode_id(part) for part in process_id]
+    if process_id is None or isinstance(process_id, (bool, int, float, str)):
+        return process_id
+    raise TypeError(f"Cannot store process id {process_id!r} of type {type(process_id).__name__} in a segment; "
+                    f"ids must be None, bool, int, float, str or tuples of these.")
+
+def _decode_id(value):
+    # Lists can only have come from tuples, since lists are not hashable ids
+    return tuple(_decode_id(part) for part in value) if isinstance(value, list) else value
+
+class ColumnarLogStore:
+    """
+    Array-backed log entries: int64 start/end columns plus a column of indexes into an
+    interned process_id table. Rows cost 24 bytes instead of a tuple and two datetimes.
+    """
+    # Segment layout: header, id_index/start_ns/end_ns columns (rows * int64 each), JSON id table.
+    # Ids may be None, bool, int, float, str or tuples of these; tuples are stored as JSON arrays.
+    HEADER = struct.Struct("<4sIQQ")  # magic, version, rows, id table bytes
+    MAGIC = b"LSEG"
+    VERSION = 1
+
+    def __init__(self):
+        self.ids = []
+        self._id_lookup = {}
+        self.id_index = array("q")
+        self.start_ns = array("q")
+        self.end_ns = array("q")
+
+    def __len__(self):
+        return len(self.start_ns)
+
+    def append(self, process_id, start_time, end_time=None):
+        index = self._id_lookup.get(process_id)
+        if index is None:
+            index = self._id_lookup[process_id] = len(self.ids)
+            self.ids.append(process_id)
+        self.id_index.append(index)
+        self.start_ns.append(to_ns(start_time))
+        self.end_ns.append(NO_END if end_time is None else to_ns(end_time))
+
+    def entry(self, row):
+        end_ns = self.end_ns[row]
+        return (self.ids[self.id_index[row]], from_ns(self.start_ns[row]), None if end_ns == NO_END else from_ns(end_ns))
+
+    def to_entries(self):
+        return [self.entry(row) for row in range(len(self))]
+
+    def write_segment(self, path):
+        id_table = json.dumps([_encode_id(process_id) for process_id in self.ids]).encode()
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(self), len(id_table)))
+            for column in (self.id_index, self.start_ns, self.end_ns):
+                column.tofile(f)
+            f.write(id_table)
+
+    def export_text(self, path):
+        """
+        Writes the rows sorted by start time in the same text format as LogServer.sort_and_write_to_file.
+        """
+        with open(path, "w") as f:
+            for row in sorted(range(len(self)), key=self.start_ns.__getitem__):
+                f.write(LogServer._format_entry(self.entry(row)))
+
+class MappedSegment(ColumnarLogStore):
+    """
+    Read-only view of a segment file. The columns are memoryviews over an mmap, so
+    opening a segment does not copy the data.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, id_table_size = self.HEADER.unpack_from(self._mmap)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a version {self.VERSION} log segment.")
+
+        view = memoryview(self._mmap)
+        offset = self.HEADER.size
+        columns = []
+        for _ in range(3):
+            columns.append(view[offset:offset + rows * 8].cast("q"))
+            offset += rows * 8
+        self.id_index, self.start_ns, self.end_ns = columns
+        self.ids = [_decode_id(value) for value in json.loads(bytes(view[offset:offset + id_table_size]))]
+        view.release()
+
+    def append(self, process_id, start_time, end_time=None):
+        raise TypeError("Mapped segments are read-only.")
+
+    def close(self):
+        for column in (self.id_index, self.start_ns, self.end_ns):
+            column.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class AsyncLogServer:
+    """
+    asyncio front-end for LogServer. start_log/end_log only enqueue; a writer task applies
+    events in batches of at most batch_size and appends completed entries to the segment
+    file in a worker thread, so the event loop never waits on disk.
+    """
+    def __init__(self, log_server=None, batch_size=1000):
+        self.log_server = log_server or LogServer()
+        self.batch_size = batch_size
+        self._queue = None
+        self._writer = None
+        self.longest_batch = 0.0  # Longest time in seconds the writer held the loop for one batch
+
+    async def start(self):
+        if self._writer is None:
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        if self._writer is not None:
+            await self._queue.put(None)
+            await self._writer
+            self._writer = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def start_log(self, process_id, start_time):
+        await self._queue.put((0, process_id, start_time))
+
+    async def end_log(self, process_id, end_time):
+        await self._queue.put((1, process_id, end_time))
+
+    async def _write_loop(self):
+        while True:
+            events = [await self._queue.get()]
+            while len(events) < self.batch_size:
+                try:
+                    events.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            started = time.perf_counter()
+            stopping = False
+            completed = []
+            for event in events:
+                if event is None:
+                    stopping = True
+                    continue
+                kind, process_id, event_time = event
+                if kind == 0:
+                    self.log_server._record_start(process_id, event_time)
+                else:
+                    entry = self.log_server._record_end(process_id, event_time)
+                    if entry is not None:
+                        completed.append(entry)
+            self.longest_batch = max(self.longest_batch, time.perf_counter() - started)
+
+            # In streaming mode _record_end already handed the entries to the flusher thread
+            if completed and not self.log_server.streaming:
+                await asyncio.to_thread(self.log_server._append_to_segment, completed)
+            if stopping:
+                return
+            # Let other tasks run between batches even when the queue never empties
+            await asyncio.sleep(0)
 
 class Process:
-    def __init__(self, process_id):
+    def __init__(self, process_id, async_log_server=None):
         self.process_id = process_id
         self.start_time = None
         self.end_time = None
+        self.async_log_server = async_log_server  # Used by "async with process"
+
+    async def __aenter__(self):
+        if self.async_log_server is None:
+            raise ValueError("async with Process requires an AsyncLogServer.")
+        self.start_time = datetime.now()
+        await self.async_log_server.start_log(self.process_id, self.start_time)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.end_time = datetime.now()
+        await self.async_log_server.end_log(self.process_id, self.end_time)
 
     def start_function(self):
         self.start_time = datetime.now()
@@ -46,3 +614,220 @@ class Process:
     def end_function(self):        
         self.end_time = datetime.now()
         LogServer().end_log(self.process_id, self.end_time)
+
+def benchmark(sizes=(1_000, 100_000, 1_000_000), samples=100_000, legacy_samples=5):
+    """
+    Completions per second with n processes in flight, streaming mode against the
+    rewrite-on-every-end_log behavior. Rates are measured over a random sample of
+    completions since every legacy completion rewrites the whole file.
+    """
+    server = LogServer()
+    base = datetime.now()
+    with tempfile.TemporaryDirectory() as directory:
+        def measure(n, n_samples, streaming):
+            server._init_state()
+            server.log_file = os.path.join(directory, "process_logs.txt")
+            for process_id in range(n):
+                server.start_log(process_id, base + timedelta(microseconds=random.randrange(n)))
+            if streaming:
+                server.enable_streaming(os.path.join(directory, "process_logs.segment"))
+            completed = random.sample(range(n), min(n_samples, n))
+            started = time.perf_counter()
+            for process_id in completed:
+                server.end_log(process_id, base)
+            if streaming:
+                server.disable_streaming()
+            return len(completed) / (time.perf_counter() - started)
+
+        for n in sizes:
+            streaming_rate = measure(n, samples, True)
+            legacy_rate = measure(n, legacy_samples, False)
+            print(f"{n:>9} entries: streaming {streaming_rate:12.0f} completions/s, legacy {legacy_rate:12.1f} completions/s")
+        server._init_state()
+
+def stress_test(n_threads=32, per_thread=10_000):
+    """
+    Runs n_threads producers against concurrent mode and checks that every process
+    is logged exactly once and closed.
+    """
+    server = LogServer()
+    server._init_state()
+    with tempfile.TemporaryDirectory() as directory:
+        server.log_file = os.path.join(directory, "process_logs.txt")
+        server.segment_file = os.path.join(directory, "process_logs.segment")
+        server.enable_concurrent()
+
+        def produce(thread_id):
+            # Every id runs twice, and each run starts and ends in the same clock tick
+            for i in range(per_thread):
+                process_id = (thread_id, i // 2)
+                moment = datetime.now()
+                server.start_log(process_id, moment)
+                server.end_log(process_id, moment)
+
+        threads = [Thread(target=produce, args=(t,)) for t in range(n_threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        produced = time.perf_counter() - started
+        server.disable_concurrent()
+        total = time.perf_counter() - started
+
+        process_ids = [entry[0] for entry in server.log_entries]
+        expected = n_threads * per_thread
+        assert len(process_ids) == expected, f"expected {expected} entries, got {len(process_ids)}"
+        assert len(set(process_ids)) == (expected + 1) // 2, "each id should have run exactly twice"
+        assert all(entry[2] is not None for entry in server.log_entries), "unclosed entries"
+        assert not server.open_entries and not server._early_ends
+        with open(server.segment_file) as f:
+            assert sum(1 for _ in f) == expected, "segment is missing completed runs"
+        print(f"{n_threads} threads, {expected} processes: producers {2 * expected / produced:.0f} events/s, "
+              f"end-to-end {2 * expected / total:.0f} events/s")
+    server._init_state()
+
+def async_benchmark(n_tasks=100_000, probe_interval=0.001):
+    """
+    Logs n_tasks concurrent asyncio tasks through AsyncLogServer while a probe task
+    measures how late the event loop wakes it, i.e. the longest the loop was blocked.
+    """
+    server = LogServer()
+    server._init_state()
+
+    async def run():
+        lags = []
+        done = asyncio.Event()
+
+        async def probe():
+            loop = asyncio.get_running_loop()
+            while not done.is_set():
+                expected = loop.time() + probe_interval
+                await asyncio.sleep(probe_interval)
+                lags.append(loop.time() - expected)
+
+        async def task(process_id, async_server):
+            async with Process(process_id, async_server):
+                await asyncio.sleep(0)
+
+        async with AsyncLogServer(server) as async_server:
+            prober = asyncio.create_task(probe())
+            started = time.perf_counter()
+            tasks = []
+            for i in range(n_tasks):
+                tasks.append(asyncio.create_task(task(i, async_server)))
+                if i % 1000 == 0:
+                    await asyncio.sleep(0)
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+        return elapsed, lags, async_server.longest_batch
+
+    with tempfile.TemporaryDirectory() as directory:
+        server.segment_file = os.path.join(directory, "process_logs.segment")
+        elapsed, lags, longest_batch = asyncio.run(run())
+        assert len(server.log_entries) == n_tasks and not server.open_entries
+        lags.sort()
+        print(f"{n_tasks} tasks in {elapsed:.2f}s ({n_tasks / elapsed:.0f} tasks/s), "
+              f"loop lag p50 {lags[len(lags) // 2] * 1000:.2f}ms, max {lags[-1] * 1000:.2f}ms, "
+              f"longest writer batch {longest_batch * 1000:.2f}ms")
+    server._init_state()
+
+def columnar_benchmark(n=1_000_000):
+    """
+    Compares bytes per record of the tuple list and text log with the columnar store
+    and binary segment.
+    """
+    base = datetime.now()
+    entries = [(i, base + timedelta(microseconds=i), base + timedelta(microseconds=2 * i)) for i in range(n)]
+    tuple_bytes = sys.getsizeof(entries) + sum(sys.getsizeof(entry) + sys.getsizeof(entry[1]) + sys.getsizeof(entry[2]) for entry in entries)
+
+    store = ColumnarLogStore()
+    for entry in entries:
+        store.append(*entry)
+    column_bytes = sum(column.buffer_info()[1] * column.itemsize for column in (store.id_index, store.start_ns, store.end_ns))
+
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, "process_logs.txt")
+        segment_path = os.path.join(directory, "process_logs.lseg")
+        store.export_text(text_path)
+        store.write_segment(segment_path)
+        started = time.perf_counter()
+        with MappedSegment(segment_path) as segment:
+            assert segment.entry(n - 1) == entries[-1]
+        opened = time.perf_counter() - started
+        print(f"{n} entries: memory {tuple_bytes / n:.0f} B/record as tuples, {column_bytes / n:.0f} B/record columnar (plus id table); "
+              f"disk {os.path.getsize(text_path) / n:.0f} B/record text, {os.path.getsize(segment_path) / n:.0f} B/record segment; "
+              f"mmap open {opened * 1000:.1f}ms")
+
+def query_benchmark(n=1_000_000, queries=20):
+    """
+    Query latency of LogQueryIndex at n entries against a full scan of log_entries.
+    """
+    server = LogServer()
+    server._init_state()
+    query_index = server.enable_queries()
+    base = datetime.now()
+    for process_id in range(n):
+        server._record_start(process_id, base + timedelta(milliseconds=process_id))
+        if process_id % 100:
+            server._record_end(process_id, base + timedelta(milliseconds=process_id + random.randrange(1, 5_000)))
+    moments = [base + timedelta(milliseconds=random.randrange(n)) for _ in range(queries)]
+
+    def timed(query):
+        started = time.perf_counter()
+        for moment in moments:
+            query(moment)
+        return (time.perf_counter() - started) / len(moments) * 1e6
+
+    window = timedelta(seconds=1)
+    query_index.percentile(50)  # Pays for the initial sort and tree build up front
+    query_index.running_at(base)
+    results = {
+        "running_at": (timed(query_index.running_at),
+                       timed(lambda t: [e for e in server.log_entries if e[1] <= t and (e[2] is None or e[2] > t)])),
+        "started_between": (timed(lambda t: query_index.started_between(t, t + window)),
+                            timed(lambda t: [e for e in server.log_entries if t <= e[1] < t + window])),
+        "p50/p99": (timed(lambda t: (query_index.percentile(50), query_index.percentile(99))),
+                    timed(lambda t: sorted(e[2] - e[1] for e in server.log_entries if e[2] is not None))),
+    }
+    for name, (indexed, scan) in results.items():
+        print(f"{n} entries, {name}: indexed {indexed:.1f}us, full scan {scan:.0f}us")
+
+    # One run spanning the whole log must not turn later running_at queries into scans
+    server._record_start("long", base)
+    server._record_end("long", base + timedelta(days=1))
+    print(f"{n} entries, running_at after one day-long run: indexed {timed(query_index.running_at):.1f}us")
+    for moment in moments:
+        expected = [e for e in server.log_entries if e[1] <= moment and (e[2] is None or e[2] > moment)]
+        result = query_index.running_at(moment)
+        assert len(result) == len(expected) and set(result) == set(expected)
+
+    # Live traffic: every query follows a few fresh starts and ends, with runs finishing out of order
+    pending = []
+    next_id = n
+    rounds = 2_000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for _ in range(2):
+            server._record_start(next_id, base + timedelta(milliseconds=next_id))
+            pending.append(next_id)
+            next_id += 1
+            if len(pending) > 50:
+                process_id = pending.pop(random.randrange(len(pending)))
+                server._record_end(process_id, base + timedelta(milliseconds=next_id))
+        query_index.percentile(99)
+        query_index.running_at(base + timedelta(milliseconds=next_id - 1_000))
+    elapsed = time.perf_counter() - started
+    durations = sorted(e[2] - e[1] for e in server.log_entries if e[2] is not None)
+    assert query_index.percentile(99) == durations[math.ceil(0.99 * len(durations)) - 1]
+    print(f"{n} entries, mixed writes and queries: {elapsed / rounds * 1e6:.1f}us per round of 2 starts, 2 ends, p99 and running_at")
+    server._init_state()
+
+if __name__ == "__main__":
+    benchmark()
+    stress_test()
+    async_benchmark()
+    columnar_benchmark()
+    query_benchmark()
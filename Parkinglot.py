@@ -1,5 +1,12 @@
 # Enum for Vehicle Size
+from contextlib import contextmanager, redirect_stdout
 from enum import Enum
+import heapq
+import io
+import random
+import sys
+from threading import Lock, Thread
+import time
 
 class VehicleSize(Enum):
     SMALL = 1
@@ -21,6 +28,7 @@ class ParkingSpot:
         self.is_occupied = False
         self.vehicle = None
         self.distances = distances  # Dictionary of distances to each entrance
+        self.version = 0  # Bumped each time the spot is freed, so older heap entries become stale
 
     def can_fit_vehicle(self, vehicle):
         return not self.is_occupied and vehicle.size.value <= self.size.value
@@ -39,6 +47,12 @@ class ParkingSpot:
             return True
         return False
 
+# Outcome of a park_many/leave_many batch
+class BatchResult:
+    def __init__(self):
+        self.assigned = {}  # license_plate -> ParkingSpot parked into or freed by the batch
+        self.failed = []  # license plates with no available spot, already parked, or not found
+
 # Class representing the parking lot with multiple floors
 class ParkingLot:
     def __init__(self, num_floors, spots_distances):
@@ -58,60 +72,273 @@ class ParkingLot:
                          }
         """
         self.spots = {}
+        self.spot_order = {}  # ParkingSpot -> position in declaration order, breaks distance ties
         for (floor, size), spot_list in spots_distances.items():
             if floor not in self.spots:
                 self.spots[floor] = {}
             self.spots[floor][size] = [ParkingSpot(spot["spot_id"], size, floor, spot["distances"]) for spot in spot_list]
+            for spot in self.spots[floor][size]:
+                self.spot_order[spot] = len(self.spot_order)
+
+        # Min-heaps of free spots per spot size and entrance, built on first use of an entrance.
+        # Entries are (distance, size, order, version, spot); an entry is stale once its spot is taken
+        # or its version no longer matches, and stale entries are discarded when they reach the top.
+        self.free_spot_heaps = {size: {} for size in VehicleSize}
+        self.parked = {}  # license_plate -> ParkingSpot currently holding that vehicle, None while reserved
+        # Free spot counters per floor and size, kept in step by park_vehicle/leave_spot
+        self.available = {floor: {size: len(spots) for size, spots in sizes.items()} for floor, sizes in self.spots.items()}
+
+        # Gates run concurrently: each size class has its own lock over its heaps, counters and
+        # spot claims, so gates looking at different sizes never wait on each other. No two size
+        # locks are ever held at once. plates_lock only guards the parked map.
+        self.size_locks = {size: Lock() for size in VehicleSize}
+        self.plates_lock = Lock()
+
+    def _free_spot_heap(self, entrance, size):
+        # Caller holds size_locks[size]
+        heaps = self.free_spot_heaps[size]
+        if entrance not in heaps:
+            heap = [(spot.distances[entrance], size.value, self.spot_order[spot], spot.version, spot)
+                    for floor in self.spots for spot in self.spots[floor].get(size, []) if not spot.is_occupied]
+            heapq.heapify(heap)
+            heaps[entrance] = heap
+        return heaps[entrance]
 
     def find_closest_available_spot(self, vehicle, entrance):
         """
         Finds the closest available parking spot for a vehicle of a particular size
         based on the entrance used. It checks across all floors.
         """
-        for floor in self.spots:
-            # Create a list of spots based on vehicle size (smaller vehicles can park in larger spots)
-            if vehicle.size == VehicleSize.SMALL:
-                spot_list = self.spots[floor].get(VehicleSize.SMALL, []) + self.spots[floor].get(VehicleSize.MEDIUM, []) + self.spots[floor].get(VehicleSize.LARGE, [])
-            elif vehicle.size == VehicleSize.MEDIUM:
-                spot_list = self.spots[floor].get(VehicleSize.MEDIUM, []) + self.spots[floor].get(VehicleSize.LARGE, [])
-            else:  # LARGE
-                spot_list = self.spots[floor].get(VehicleSize.LARGE, [])
-
-            # Filter available spots
-            available_spots = [spot for spot in spot_list if not spot.is_occupied]
-
-            # Sort available spots by distance to the specified entrance and return the closest one
-            if available_spots:
-                closest_spot = sorted(available_spots, key=lambda spot: spot.distances[entrance])[0]
-                return closest_spot
-        
-        return None
+        best = None
+        # Smaller vehicles can park in larger spots
+        for size in VehicleSize:
+            if size.value < vehicle.size.value:
+                continue
+            with self.size_locks[size]:
+                heap = self._free_spot_heap(entrance, size)
+                while heap and (heap[0][4].is_occupied or heap[0][3] != heap[0][4].version):
+                    heapq.heappop(heap)
+                if heap and (best is None or heap[0][:3] < best[:3]):
+                    best = heap[0]
+        return best[4] if best else None
+
+    def _release_spot(self, spot):
+        # Caller holds size_locks[spot.size]
+        spot.version += 1
+        for entrance, heap in self.free_spot_heaps[spot.size].items():
+            heapq.heappush(heap, (spot.distances[entrance], spot.size.value, self.spot_order[spot], spot.version, spot))
+
+    def _reserve_plate(self, vehicle_license_plate):
+        with self.plates_lock:
+            if vehicle_license_plate in self.parked:
+                return False
+            self.parked[vehicle_license_plate] = None
+            return True
 
     def park_vehicle(self, vehicle, entrance):
-        spot = self.find_closest_available_spot(vehicle, entrance)
+        if not self._reserve_plate(vehicle.license_plate):
+            print(f'Vehicle {vehicle.license_plate} is already parked')
+            return None
+        spot = self._assign_spot(vehicle, entrance)
         if spot:
-            spot.park_vehicle(vehicle)
             print(f'Vehicle {vehicle.license_plate} parked at spot {spot.spot_id}, floor {spot.floor}, distance to {entrance}: {spot.distances[entrance]}')
         else:
             print(f'No available spots for vehicle {vehicle.license_plate}')
+        return spot
+
+    def _assign_spot(self, vehicle, entrance):
+        # The plate is already reserved; the spot is claimed with compare-and-claim under its
+        # size lock, and another gate winning the same spot just sends us back to the heaps
+        while True:
+            spot = self.find_closest_available_spot(vehicle, entrance)
+            if spot is None:
+                with self.plates_lock:
+                    del self.parked[vehicle.license_plate]
+                return None
+            with self.size_locks[spot.size]:
+                if spot.park_vehicle(vehicle):
+                    self.available[spot.floor][spot.size] -= 1
+                    break
+        with self.plates_lock:
+            self.parked[vehicle.license_plate] = spot
+        return spot
 
     def leave_spot(self, vehicle_license_plate):
-        for floor in self.spots:
-            for size in self.spots[floor]:
-                for spot in self.spots[floor][size]:
-                    if spot.is_occupied and spot.vehicle.license_plate == vehicle_license_plate:
-                        spot.remove_vehicle()
-                        print(f'Vehicle {vehicle_license_plate} has left spot {spot.spot_id} on floor {spot.floor}')
-                        return
-        print(f'Vehicle {vehicle_license_plate} not found in the parking lot.')
+        spot = self._free_spot(vehicle_license_plate)
+        if spot is None:
+            print(f'Vehicle {vehicle_license_plate} not found in the parking lot.')
+            return
+        print(f'Vehicle {vehicle_license_plate} has left spot {spot.spot_id} on floor {spot.floor}')
+
+    def _free_spot(self, vehicle_license_plate):
+        with self.plates_lock:
+            spot = self.parked.get(vehicle_license_plate)
+            if spot is None:
+                return None
+            del self.parked[vehicle_license_plate]
+        with self.size_locks[spot.size]:
+            spot.remove_vehicle()
+            self.available[spot.floor][spot.size] += 1
+            self._release_spot(spot)
+        return spot
+
+    def park_many(self, vehicles, entrance):
+        """
+        Parks a wave of vehicles arriving through one entrance and returns a BatchResult.
+        Assignment is greedy on distance, largest vehicles first so smaller ones
+        cannot take the only spots that fit them.
+        """
+        result = BatchResult()
+        for vehicle in sorted(vehicles, key=lambda vehicle: vehicle.size.value, reverse=True):
+            if not self._reserve_plate(vehicle.license_plate):
+                result.failed.append(vehicle.license_plate)
+                continue
+            spot = self._assign_spot(vehicle, entrance)
+            if spot:
+                result.assigned[vehicle.license_plate] = spot
+            else:
+                result.failed.append(vehicle.license_plate)
+        return result
+
+    def leave_many(self, vehicle_license_plates):
+        result = BatchResult()
+        for vehicle_license_plate in vehicle_license_plates:
+            spot = self._free_spot(vehicle_license_plate)
+            if spot:
+                result.assigned[vehicle_license_plate] = spot
+            else:
+                result.failed.append(vehicle_license_plate)
+        return result
+
+    def get_available_spots(self):
+        """
+        Returns a snapshot of free spot counts as {floor: {VehicleSize: count}}.
+        """
+        return {floor: dict(counts) for floor, counts in self.available.items()}
 
     def display_available_spots(self):
-        for floor in self.spots:
+        for floor, counts in self.get_available_spots().items():
             print(f"Floor {floor}:")
-            for size, spots in self.spots[floor].items():
-                available = sum(1 for spot in spots if not spot.is_occupied)
+            for size, available in counts.items():
                 print(f"  Available {size.name} spots: {available}")
 
+def _random_spots_distances(n_spots, n_floors, entrances):
+    # Spots spread round-robin over the floors, with random sizes and random distances to every entrance
+    spots_distances = {}
+    for i in range(n_spots):
+        key = (i % n_floors, random.choice(list(VehicleSize)))
+        spots_distances.setdefault(key, []).append(
+            {"spot_id": f"S{i}", "distances": {entrance: random.randrange(1_000) for entrance in entrances}})
+    return spots_distances
+
+@contextmanager
+def _frequent_thread_switches():
+    # Switches threads as often as possible to expose races, then restores the old interval
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        yield
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+def benchmark(n_spots=100_000, n_entrances=10, n_floors=10, n_vehicles=300):
+    """
+    Parks n_vehicles through random entrances with the heap index and with the old
+    concatenate-filter-sort lookup, and reports lookups per second.
+    """
+    entrances = [f"Entrance{i}" for i in range(n_entrances)]
+    spots_distances = _random_spots_distances(n_spots, n_floors, entrances)
+    vehicles = [Vehicle(f"CAR{i}", random.choice(list(VehicleSize))) for i in range(n_vehicles)]
+
+    def sort_lookup(lot, vehicle, entrance):
+        candidates = [spot for floor in lot.spots for size, spots in lot.spots[floor].items()
+                      if size.value >= vehicle.size.value for spot in spots if not spot.is_occupied]
+        return sorted(candidates, key=lambda spot: spot.distances[entrance])[0] if candidates else None
+
+    for name, lookup in (("heap", ParkingLot.find_closest_available_spot), ("sort", sort_lookup)):
+        lot = ParkingLot(num_floors=n_floors, spots_distances=spots_distances)
+        for entrance in entrances:
+            lot.find_closest_available_spot(Vehicle("WARMUP", VehicleSize.SMALL), entrance)  # Builds every heap outside the timed loop
+        started = time.perf_counter()
+        for vehicle in vehicles:
+            lookup(lot, vehicle, random.choice(entrances)).park_vehicle(vehicle)
+        elapsed = time.perf_counter() - started
+        print(f"{name}: {n_spots} spots, {n_entrances} entrances: {n_vehicles / elapsed:.0f} parks/s")
+
+def batch_benchmark(n_spots=100_000, n_entrances=10, n_floors=10, wave=500, n_waves=20):
+    """
+    Vehicles per second admitted and released with park_many/leave_many against
+    calling park_vehicle/leave_spot once per vehicle.
+    """
+    entrances = [f"Entrance{i}" for i in range(n_entrances)]
+    spots_distances = _random_spots_distances(n_spots, n_floors, entrances)
+    waves = [[Vehicle(f"CAR{w}_{i}", random.choice(list(VehicleSize))) for i in range(wave)] for w in range(n_waves)]
+
+    def per_vehicle(lot, vehicles, entrance):
+        for vehicle in vehicles:
+            lot.park_vehicle(vehicle, entrance)
+        for vehicle in vehicles:
+            lot.leave_spot(vehicle.license_plate)
+
+    def batched(lot, vehicles, entrance):
+        lot.park_many(vehicles, entrance)
+        lot.leave_many([vehicle.license_plate for vehicle in vehicles])
+
+    for name, run in (("batch", batched), ("per-vehicle", per_vehicle)):
+        lot = ParkingLot(num_floors=n_floors, spots_distances=spots_distances)
+        for entrance in entrances:
+            lot.find_closest_available_spot(Vehicle("WARMUP", VehicleSize.SMALL), entrance)
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            for vehicles in waves:
+                run(lot, vehicles, random.choice(entrances))
+        elapsed = time.perf_counter() - started
+        print(f"{name}: {wave * n_waves / elapsed:.0f} vehicles/s in waves of {wave}")
+
+def stress_test(n_spots=20_000, n_entrances=10, n_floors=10, gate_counts=(1, 2, 4, 8, 16, 32), rounds=3):
+    """
+    Runs concurrent gates that park and release vehicles on one lot, checks that no
+    spot was handed to two vehicles and that the counters match the spots, and prints
+    operations per second for each number of gates.
+    """
+    entrances = [f"Entrance{i}" for i in range(n_entrances)]
+    spots_distances = _random_spots_distances(n_spots, n_floors, entrances)
+
+    with _frequent_thread_switches():
+        for n_gates in gate_counts:
+            lot = ParkingLot(num_floors=n_floors, spots_distances=spots_distances)
+            per_gate = n_spots // n_gates
+            claims = [[] for _ in range(n_gates)]
+
+            def gate(g):
+                entrance = entrances[g % n_entrances]
+                for r in range(rounds):
+                    vehicles = [Vehicle(f"G{g}R{r}_{i}", random.choice(list(VehicleSize))) for i in range(per_gate)]
+                    for vehicle in vehicles:
+                        spot = lot._assign_spot(vehicle, entrance) if lot._reserve_plate(vehicle.license_plate) else None
+                        if spot:
+                            claims[g].append((spot, vehicle.license_plate))
+                    if r < rounds - 1:
+                        lot.leave_many([vehicle.license_plate for vehicle in vehicles])
+
+            threads = [Thread(target=gate, args=(g,)) for g in range(n_gates)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            # Vehicles from the last round are still parked: every spot must hold exactly the vehicle it was given
+            final = [(spot, plate) for gate_claims in claims for spot, plate in gate_claims if plate in lot.parked]
+            assert len({spot for spot, _ in final}) == len(final), "spot assigned twice"
+            assert all(spot.vehicle.license_plate == plate and lot.parked[plate] is spot for spot, plate in final)
+            for floor, sizes in lot.spots.items():
+                for size, spots in sizes.items():
+                    assert lot.available[floor][size] == sum(1 for spot in spots if not spot.is_occupied)
+            operations = sum(len(gate_claims) for gate_claims in claims) * 2 - len(final)
+            print(f"{n_gates:>2} gates: {operations / elapsed:.0f} park/leave operations/s")
+
 # Example usage
 if __name__ == "__main__":
     # Define parking spots and distances
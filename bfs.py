@@ -1,13 +1,56 @@
-from collections import deque
+from array import array
+from collections import OrderedDict, deque
+from multiprocessing import Pool, shared_memory
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+class Connections(list):
+    # A list that bumps Person.graph_version whenever it is modified, so cached searches know to recompute
+    def _changed(method):
+        def wrapper(self, *args, **kwargs):
+            Person.graph_version += 1
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    append = _changed(list.append)
+    extend = _changed(list.extend)
+    insert = _changed(list.insert)
+    remove = _changed(list.remove)
+    pop = _changed(list.pop)
+    clear = _changed(list.clear)
+    sort = _changed(list.sort)
+    reverse = _changed(list.reverse)
+    __setitem__ = _changed(list.__setitem__)
+    __delitem__ = _changed(list.__delitem__)
+    __iadd__ = _changed(list.__iadd__)
+    __imul__ = _changed(list.__imul__)
+    del _changed
 
 class Person:
+    graph_version = 0  # Incremented on every change to any person's connections
+
     def __init__(self, name):
         self.name = name
-        self.connections = []
+        # Set directly rather than through the setter: nobody links to a new person yet, so its
+        # creation cannot change any cached search and must not invalidate them
+        self._connections = Connections()
+
+    @property
+    def connections(self):
+        return self._connections
+
+    @connections.setter
+    def connections(self, connections):
+        Person.graph_version += 1
+        self._connections = Connections(connections)
 
     def getAllConnections(self):
         # Returns the list of direct connections (friends) for this person
-        return self.connections
+        return self._connections
 
 def shortestPath(personA, personB):
     if personA == personB:
@@ -34,6 +77,560 @@ def shortestPath(personA, personB):
     # If no path is found, return an empty list
     return []
 
+class CSRGraph:
+    # Compressed sparse row graph: node i's connections are targets[offsets[i]:offsets[i + 1]] (int32 ids),
+    # in the same order as Person.connections, and names[i] is its name
+    def __init__(self, names, offsets, targets):
+        self.names = names
+        self.offsets = offsets
+        self.targets = targets
+        self.ids = {}
+        for node, name in enumerate(names):
+            self.ids.setdefault(name, node)
+
+    @classmethod
+    def fromEdges(cls, names, sources, targets):
+        # Counting sort of the edges by source, stable so each node keeps its edge order
+        offsets = array("q", bytes(8 * (len(names) + 1)))
+        for source in sources:
+            offsets[source + 1] += 1
+        for node in range(len(names)):
+            offsets[node + 1] += offsets[node]
+        position = array("q", offsets[:-1])
+        placed = array("i", bytes(4 * len(targets)))
+        for source, target in zip(sources, targets):
+            placed[position[source]] = target
+            position[source] += 1
+        return cls(names, offsets, placed)
+
+    @classmethod
+    def fromEdgeList(cls, path):
+        # One "source target" pair of names per line, or a lone name for a node with no edges;
+        # blank lines and lines starting with # are skipped
+        names = []
+        ids = {}
+        sources = array("i")
+        targets = array("i")
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                fields = line.split()
+                if not fields or fields[0].startswith("#"):
+                    continue
+                if len(fields) > 2:
+                    raise ValueError(f"{path}:{line_number}: expected 'source target', got {len(fields)} fields.")
+                nodes = []
+                for name in fields:
+                    node = ids.get(name)
+                    if node is None:
+                        node = ids[name] = len(names)
+                        names.append(name)
+                    nodes.append(node)
+                if len(nodes) == 2:
+                    sources.append(nodes[0])
+                    targets.append(nodes[1])
+        return cls.fromEdges(names, sources, targets)
+
+    @classmethod
+    def fromPeople(cls, people):
+        # people must include everyone their connections point to
+        ids = {person: node for node, person in enumerate(people)}
+        offsets = array("q", [0])
+        targets = array("i")
+        for person in people:
+            targets.extend(ids[neighbor] for neighbor in person.getAllConnections())
+            offsets.append(len(targets))
+        return cls([person.name for person in people], offsets, targets)
+
+    def toPeople(self):
+        people = [Person(name) for name in self.names]
+        for node, person in enumerate(people):
+            person.connections = [people[target] for target in self.getAllConnections(node)]
+        return people
+
+    def getAllConnections(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def shortestPath(self, nameA, nameB):
+        # Same search and result as shortestPath, over node ids instead of Person objects
+        source, target = self.ids[nameA], self.ids[nameB]
+        if source == target:
+            return [nameA]
+
+        parent = array("q", [-1]) * len(self.names)
+        parent[source] = source
+        queue = deque([source])
+        offsets, targets = self.offsets, self.targets
+
+        while queue:
+            current = queue.popleft()
+            for neighbor in targets[offsets[current]:offsets[current + 1]]:
+                if neighbor == target:
+                    path = [self.names[neighbor]]
+                    while current != source:
+                        path.append(self.names[current])
+                        current = parent[current]
+                    path.append(self.names[source])
+                    path.reverse()
+                    return path
+
+                if parent[neighbor] < 0:
+                    parent[neighbor] = current
+                    queue.append(neighbor)
+
+        return []
+
+# Views of the shared graph inside a pool worker, set up by _attachSharedGraph. Only workers use
+# this global; the parent keeps each ParallelBFS's views on the instance.
+_shared = {}
+
+def _attachSharedGraph(segment_names):
+    _shared.update(_sharedViews({key: shared_memory.SharedMemory(name=name) for key, name in segment_names.items()}))
+
+def _sharedViews(segments):
+    return {
+        "segments": segments,
+        "offsets": segments["offsets"].buf.cast("q"),
+        "targets": segments["targets"].buf.cast("i"),
+        "frontier": segments["frontier"].buf.cast("i"),
+        "visited": segments["visited"].buf,
+    }
+
+def _releaseSharedViews(views):
+    for key in ("offsets", "targets", "frontier"):
+        views.pop(key).release()
+    del views["visited"]
+    return views.pop("segments")
+
+def _expandFrontier(lo, hi):
+    return _expandRange(_shared, lo, hi)
+
+def _expandRange(views, lo, hi):
+    # Unvisited neighbors of frontier[lo:hi] in frontier order, with the node that reached each one
+    offsets, targets, frontier, visited = views["offsets"], views["targets"], views["frontier"], views["visited"]
+    nodes = array("i")
+    parents = array("i")
+    for i in range(lo, hi):
+        current = frontier[i]
+        for neighbor in targets[offsets[current]:offsets[current + 1]]:
+            if not visited[neighbor]:
+                nodes.append(neighbor)
+                parents.append(current)
+    return nodes.tobytes(), parents.tobytes()
+
+class ParallelBFS:
+    # Level-synchronous BFS over a CSRGraph copied into shared memory. Each level the frontier is
+    # written to shared memory and split into ranges; pool workers scan their range's edges and
+    # return unvisited candidates as int arrays, so no Person objects are ever pickled. The parent
+    # process merges candidates in frontier order, which makes the result identical to shortestPath.
+    def __init__(self, graph, workers=4, min_parallel_frontier=1_000):
+        self.graph = graph
+        self.workers = workers
+        self.min_parallel_frontier = min_parallel_frontier
+        n_nodes, n_edges = len(graph.names), len(graph.targets)
+        sizes = {"offsets": 8 * (n_nodes + 1), "targets": 4 * n_edges, "frontier": 4 * n_nodes, "visited": n_nodes}
+        self.segments = {}
+        self.views = None
+        self.pool = None
+        try:
+            for key, size in sizes.items():
+                # Rounded up to a non-zero multiple of 8 so every buffer casts to its item size,
+                # even for a graph with no nodes or no edges
+                self.segments[key] = shared_memory.SharedMemory(create=True, size=max(-(-size // 8) * 8, 8))
+            self.segments["offsets"].buf[:sizes["offsets"]] = graph.offsets.tobytes()
+            self.segments["targets"].buf[:sizes["targets"]] = graph.targets.tobytes()
+            # This process expands small levels itself through its own views of the same segments
+            self.views = _sharedViews(self.segments)
+            if workers > 1:
+                self.pool = Pool(workers, _attachSharedGraph,
+                                 ({key: segment.name for key, segment in self.segments.items()},))
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.views is not None:
+            _releaseSharedViews(self.views)
+            self.views = None
+        for segment in self.segments.values():
+            segment.close()
+            segment.unlink()
+        self.segments = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def shortestPath(self, nameA, nameB):
+        graph = self.graph
+        source, target = graph.ids[nameA], graph.ids[nameB]
+        if source == target:
+            return [nameA]
+
+        frontier, visited = self.views["frontier"], self.views["visited"]
+        visited[:len(graph.names)] = bytes(len(graph.names))
+        visited[source] = 1
+        parent = {source: source}
+        level = array("i", [source])
+
+        while level:
+            frontier[:len(level)] = level
+            if self.pool is None or len(level) < self.min_parallel_frontier:
+                chunks = [_expandRange(self.views, 0, len(level))]
+            else:
+                step = -(-len(level) // self.workers)
+                chunks = self.pool.starmap(_expandFrontier, [(lo, min(lo + step, len(level))) for lo in range(0, len(level), step)])
+
+            level = array("i")
+            for node_bytes, parent_bytes in chunks:
+                nodes, parents = array("i"), array("i")
+                nodes.frombytes(node_bytes)
+                parents.frombytes(parent_bytes)
+                for neighbor, current in zip(nodes, parents):
+                    if neighbor == target:
+                        path = [graph.names[neighbor]]
+                        while current != source:
+                            path.append(graph.names[current])
+                            current = parent[current]
+                        path.append(graph.names[source])
+                        path.reverse()
+                        return path
+                    if not visited[neighbor]:
+                        visited[neighbor] = 1
+                        parent[neighbor] = current
+                        level.append(neighbor)
+
+        return []
+
+def shortestPathParents(personA, personB):
+    # Same search as shortestPath, but the queue holds only people and each discovered person
+    # records who found it; the path is rebuilt once, when personB is reached
+    if personA == personB:
+        return [personA.name]
+
+    parent = {personA: None}
+    queue = deque([personA])
+
+    while queue:
+        currentPerson = queue.popleft()
+        for neighbor in currentPerson.getAllConnections():
+            if neighbor == personB:
+                path = [neighbor.name]
+                while currentPerson is not None:
+                    path.append(currentPerson.name)
+                    currentPerson = parent[currentPerson]
+                path.reverse()
+                return path
+
+            if neighbor not in parent:
+                parent[neighbor] = currentPerson
+                queue.append(neighbor)
+
+    return []
+
+class HopDistanceService:
+    # Degrees-of-separation queries. Full BFS trees are cached per source in an LRU and reused
+    # for every target; any change to connections (Person.graph_version) makes them stale.
+    # Landmarks give fast approximate answers from precomputed distances to and from a few people.
+    def __init__(self, cache_size=64):
+        self.cache_size = cache_size
+        self.trees = OrderedDict()  # source -> (graph_version, parent dict, depth dict)
+        self.landmarks = []  # (graph_version, landmark, distances from it, distances to it)
+
+    def getTree(self, source):
+        entry = self.trees.get(source)
+        if entry is not None and entry[0] == Person.graph_version:
+            self.trees.move_to_end(source)
+            return entry[1], entry[2]
+
+        parent = {source: None}
+        depth = {source: 0}
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            for neighbor in current.getAllConnections():
+                if neighbor not in parent:
+                    parent[neighbor] = current
+                    depth[neighbor] = depth[current] + 1
+                    queue.append(neighbor)
+
+        self.trees[source] = (Person.graph_version, parent, depth)
+        self.trees.move_to_end(source)
+        while len(self.trees) > self.cache_size:
+            self.trees.popitem(last=False)
+        return parent, depth
+
+    def getDistance(self, personA, personB):
+        # Hop count, or None when personB is unreachable
+        return self.getTree(personA)[1].get(personB)
+
+    def getPath(self, personA, personB):
+        parent, _ = self.getTree(personA)
+        if personB not in parent:
+            return []
+        path = []
+        person = personB
+        while person is not None:
+            path.append(person.name)
+            person = parent[person]
+        path.reverse()
+        return path
+
+    def getDistances(self, pairs):
+        # Answers many (personA, personB) pairs with one BFS per distinct source
+        by_source = {}
+        for index, (personA, personB) in enumerate(pairs):
+            by_source.setdefault(personA, []).append((index, personB))
+        distances = [None] * len(pairs)
+        for source, targets in by_source.items():
+            depth = self.getTree(source)[1]
+            for index, target in targets:
+                distances[index] = depth.get(target)
+        return distances
+
+    def setLandmarks(self, people, n_landmarks=8):
+        # Uses the best-connected people as landmarks; the backward searches need reverse connections
+        reverse_connections = buildReverseConnections(people)
+        chosen = sorted(people, key=lambda person: len(person.getAllConnections()), reverse=True)[:n_landmarks]
+        self.landmarks = []
+        for landmark in chosen:
+            from_landmark = self._levels(landmark, lambda person: person.getAllConnections())
+            to_landmark = self._levels(landmark, lambda person: reverse_connections.get(person, []))
+            self.landmarks.append((Person.graph_version, landmark, from_landmark, to_landmark))
+
+    @staticmethod
+    def _levels(start, neighbors):
+        depth = {start: 0}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for neighbor in neighbors(current):
+                if neighbor not in depth:
+                    depth[neighbor] = depth[current] + 1
+                    queue.append(neighbor)
+        return depth
+
+    def estimateDistance(self, personA, personB):
+        # Upper bound through the best landmark, or None if no landmark connects the two or the
+        # landmarks are stale; exact whenever some shortest path passes through a landmark
+        best = None
+        for version, _, from_landmark, to_landmark in self.landmarks:
+            if version != Person.graph_version:
+                return None
+            if personA in to_landmark and personB in from_landmark:
+                estimate = to_landmark[personA] + from_landmark[personB]
+                if best is None or estimate < best:
+                    best = estimate
+        return best
+
+def buildReverseConnections(people):
+    # Maps each person to the people who list them in connections
+    reverse_connections = {}
+    for person in people:
+        for neighbor in person.getAllConnections():
+            reverse_connections.setdefault(neighbor, []).append(person)
+    return reverse_connections
+
+def reachableFrom(person):
+    # Everyone reachable from person, in BFS order
+    seen = {person}
+    order = [person]
+    queue = deque([person])
+    while queue:
+        for neighbor in queue.popleft().getAllConnections():
+            if neighbor not in seen:
+                seen.add(neighbor)
+                order.append(neighbor)
+                queue.append(neighbor)
+    return order
+
+def bidirectionalShortestPath(personA, personB, reverse_connections=None, stats=None):
+    # Searches forward from personA and backward from personB, always expanding the smaller frontier
+    # one full level at a time. Without reverse_connections it is built from everyone reachable from
+    # personA, which is enough for correctness but costs a full traversal; pass it in for repeated queries.
+    if personA == personB:
+        return [personA.name]
+    if reverse_connections is None:
+        reverse_connections = buildReverseConnections(reachableFrom(personA))
+
+    forward_parent = {personA: None}
+    backward_parent = {personB: None}
+    forward_depth = {personA: 0}
+    backward_depth = {personB: 0}
+    forward_frontier = [personA]
+    backward_frontier = [personB]
+    meeting = None
+    expanded = 0
+
+    while forward_frontier and backward_frontier and meeting is None:
+        expand_forward = len(forward_frontier) <= len(backward_frontier)
+        if expand_forward:
+            frontier, parent, depth, other_depth = forward_frontier, forward_parent, forward_depth, backward_depth
+        else:
+            frontier, parent, depth, other_depth = backward_frontier, backward_parent, backward_depth, forward_depth
+        next_frontier = []
+        best = None
+        expanded += len(frontier)
+        for current in frontier:
+            neighbors = current.getAllConnections() if expand_forward else reverse_connections.get(current, [])
+            for neighbor in neighbors:
+                if neighbor not in parent:
+                    parent[neighbor] = current
+                    depth[neighbor] = depth[current] + 1
+                    next_frontier.append(neighbor)
+                if neighbor in other_depth:
+                    # Finish the level, then keep the meeting point with the shortest total length
+                    total = depth[neighbor] + other_depth[neighbor]
+                    if best is None or total < best[0]:
+                        best = (total, neighbor)
+        if best is not None:
+            meeting = best[1]
+        if expand_forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    if stats is not None:
+        stats["expanded"] = expanded
+    if meeting is None:
+        return []
+
+    path = []
+    person = meeting
+    while person is not None:
+        path.append(person.name)
+        person = forward_parent[person]
+    path.reverse()
+    person = backward_parent[meeting]
+    while person is not None:
+        path.append(person.name)
+        person = backward_parent[person]
+    return path
+
+def buildRandomGraph(n_people, average_degree, seed=0):
+    rng = random.Random(seed)
+    people = [Person(str(i)) for i in range(n_people)]
+    for person in people:
+        person.connections = [people[rng.randrange(n_people)] for _ in range(average_degree)]
+    return people
+
+def benchmarkBidirectional(n_people=1_000_000, average_degree=20, n_queries=20):
+    people = buildRandomGraph(n_people, average_degree)
+    started = time.perf_counter()
+    reverse_connections = buildReverseConnections(people)
+    print(f"{n_people} people, degree {average_degree}: reverse connections built in {time.perf_counter() - started:.1f}s")
+
+    # Count how many people each search expands by wrapping getAllConnections
+    expanded = [0]
+    getAllConnections = Person.getAllConnections
+    def countingGetAllConnections(person):
+        expanded[0] += 1
+        return getAllConnections(person)
+
+    rng = random.Random(1)
+    totals = {"one-sided": [0.0, 0], "bidirectional": [0.0, 0]}
+    for _ in range(n_queries):
+        personA, personB = people[rng.randrange(n_people)], people[rng.randrange(n_people)]
+        Person.getAllConnections = countingGetAllConnections
+        expanded[0] = 0
+        started = time.perf_counter()
+        one_sided = shortestPath(personA, personB)
+        totals["one-sided"][0] += time.perf_counter() - started
+        totals["one-sided"][1] += expanded[0]
+        Person.getAllConnections = getAllConnections
+
+        stats = {}
+        started = time.perf_counter()
+        bidirectional = bidirectionalShortestPath(personA, personB, reverse_connections, stats)
+        totals["bidirectional"][0] += time.perf_counter() - started
+        totals["bidirectional"][1] += stats["expanded"]
+        assert len(one_sided) == len(bidirectional)
+
+    for name, (elapsed, visited) in totals.items():
+        print(f"{name}: {elapsed / n_queries * 1000:.1f}ms/query, {visited / n_queries:.0f} people expanded/query")
+
+def benchmarkParentPointers(n_people=200_000, average_degree=8, n_queries=20):
+    people = buildRandomGraph(n_people, average_degree)
+    rng = random.Random(2)
+    queries = [(people[rng.randrange(n_people)], people[rng.randrange(n_people)]) for _ in range(n_queries)]
+    results = {}
+    for name, search in (("path copies", shortestPath), ("parent pointers", shortestPathParents)):
+        peaks = []
+        started = time.perf_counter()
+        for personA, personB in queries:
+            tracemalloc.start()
+            results.setdefault((personA, personB), []).append(search(personA, personB))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        traced = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for personA, personB in queries:
+            search(personA, personB)
+        elapsed = time.perf_counter() - started
+        print(f"{name}: {n_queries / elapsed:.1f} queries/s, peak {max(peaks) / 2**20:.1f} MiB, "
+              f"mean peak {sum(peaks) / len(peaks) / 2**20:.1f} MiB per query (traced run {traced:.1f}s)")
+    assert all(first == second for first, second in results.values())
+
+def benchmarkCSR(n_people=200_000, average_degree=10, n_queries=20):
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as directory:
+        edge_list = os.path.join(directory, "edges.txt")
+        with open(edge_list, "w") as f:
+            for source in range(n_people):
+                for _ in range(average_degree):
+                    f.write(f"{source} {rng.randrange(n_people)}\n")
+        n_edges = n_people * average_degree
+
+        started = time.perf_counter()
+        graph = CSRGraph.fromEdgeList(edge_list)
+        csr_load = time.perf_counter() - started
+
+    # Both sides count the name strings; the CSR side also counts its name -> id table
+    name_bytes = sum(sys.getsizeof(name) for name in graph.names)
+    csr_bytes = (name_bytes + sys.getsizeof(graph.names) + sys.getsizeof(graph.ids)
+                 + sum(column.buffer_info()[1] * column.itemsize for column in (graph.offsets, graph.targets)))
+    tracemalloc.start()
+    people = graph.toPeople()
+    person_bytes = tracemalloc.get_traced_memory()[0] + name_bytes
+    tracemalloc.stop()
+    print(f"{n_people} people, {n_edges} edges: CSR {csr_bytes / n_edges:.1f} B/edge (loaded in {csr_load:.1f}s), "
+          f"Person objects {person_bytes / n_edges:.1f} B/edge")
+
+    queries = [(str(rng.randrange(n_people)), str(rng.randrange(n_people))) for _ in range(n_queries)]
+    by_name = {person.name: person for person in people}
+    started = time.perf_counter()
+    object_paths = [shortestPathParents(by_name[nameA], by_name[nameB]) for nameA, nameB in queries]
+    object_time = time.perf_counter() - started
+    started = time.perf_counter()
+    csr_paths = [graph.shortestPath(nameA, nameB) for nameA, nameB in queries]
+    csr_time = time.perf_counter() - started
+    assert object_paths == csr_paths
+    print(f"BFS: Person objects {n_queries / object_time:.1f} queries/s, CSR {n_queries / csr_time:.1f} queries/s")
+
+def benchmarkParallel(n_people=1_000_000, average_degree=10, n_queries=5, worker_counts=(1, 2, 4, 8)):
+    rng = random.Random(4)
+    names = [str(i) for i in range(n_people)]
+    sources = array("i", (i for i in range(n_people) for _ in range(average_degree)))
+    targets = array("i", (rng.randrange(n_people) for _ in range(n_people * average_degree)))
+    graph = CSRGraph.fromEdges(names, sources, targets)
+    queries = [(str(rng.randrange(n_people)), str(rng.randrange(n_people))) for _ in range(n_queries)]
+    expected = [graph.shortestPath(nameA, nameB) for nameA, nameB in queries]
+
+    print(f"{n_people} people, {len(targets)} edges, {os.cpu_count()} CPUs")
+    for workers in worker_counts:
+        with ParallelBFS(graph, workers) as search:
+            started = time.perf_counter()
+            paths = [search.shortestPath(nameA, nameB) for nameA, nameB in queries]
+            elapsed = time.perf_counter() - started
+        assert paths == expected
+        print(f"{workers} workers: {elapsed / n_queries * 1000:.0f}ms/query")
+
 # Example usage:
 if __name__ == "__main__":
     # Create people
@@ -53,3 +650,11 @@ if __name__ == "__main__":
     # Find the shortest path between personA and personG
     path = shortestPath(personA, personG)
     print("Shortest path:", path)  # Output: ['A', 'B', 'G']
+    print("Parent pointers:", shortestPathParents(personA, personG))  # Output: ['A', 'B', 'G']
+    graph = CSRGraph.fromPeople([personA, personB, personC, personD, personE, personG])
+    print("CSR:", graph.shortestPath("A", "G"))  # Output: ['A', 'B', 'G']
+    service = HopDistanceService()
+    print("Distances from A:", service.getDistances([(personA, personG), (personA, personC), (personA, personA)]))  # Output: [2, 2, 0]
+    with ParallelBFS(graph, workers=2, min_parallel_frontier=1) as search:
+        print("Parallel:", search.shortestPath("A", "G"))  # Output: ['A', 'B', 'G']
+    print("Bidirectional:", bidirectionalShortestPath(personA, personG))  # Output: ['A', 'B', 'G']
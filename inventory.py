@@ -1,5 +1,15 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
-from typing import Dict, List, Set
+import random
+import sys
+from threading import Lock
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import time
+import tracemalloc
 
 class LocationType(Enum):
     SMALL = 1
@@ -14,9 +24,14 @@ class Location:
         self.location_id = Location.location_count
         self.is_available = True
         self.location_type = location_type
+        self.inventory: 'InventorySystem' = None
 
     def set_is_available(self, is_available: bool):
-        self.is_available = is_available
+        # The owning inventory makes the change so its free pools and counts stay in step with the flag
+        if self.inventory is not None:
+            self.inventory.set_location_availability(self, is_available)
+        else:
+            self.is_available = is_available
 
     def get_is_available(self) -> bool:
         return self.is_available
@@ -29,10 +44,66 @@ class Unit:
         self.unit_id = Unit.unit_count
         self.product_id = product_id
         self.location = location
-        self.location.set_is_available(False)
+        if self.location is not None:
+            self.location.set_is_available(False)
 
     def free_location(self):
-        self.location.set_is_available(True)
+        if self.location is not None:
+            self.location.set_is_available(True)
+
+class UnitStore:
+    # Columnar units of one product: unit ids ascending (they are handed out in increasing order)
+    # and the location id each unit occupies. Removed units are tombstoned and compacted lazily.
+    __slots__ = ("unit_ids", "location_ids", "count")
+    REMOVED = -1
+
+    def __init__(self):
+        self.unit_ids = array("q")
+        self.location_ids = array("q")
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for unit_id, location_id in zip(self.unit_ids, self.location_ids):
+            if location_id != self.REMOVED:
+                yield unit_id, location_id
+
+    def add(self, first_unit_id: int, location_ids: Iterable[int]):
+        start = len(self.location_ids)
+        self.location_ids.extend(location_ids)
+        added = len(self.location_ids) - start
+        self.unit_ids.extend(range(first_unit_id, first_unit_id + added))
+        self.count += added
+
+    def _row(self, unit_id: int) -> Optional[int]:
+        row = bisect_left(self.unit_ids, unit_id)
+        if row < len(self.unit_ids) and self.unit_ids[row] == unit_id and self.location_ids[row] != self.REMOVED:
+            return row
+        return None
+
+    def get_location_id(self, unit_id: int) -> Optional[int]:
+        row = self._row(unit_id)
+        return None if row is None else self.location_ids[row]
+
+    def remove(self, unit_ids: Iterable[int]) -> List[int]:
+        # Returns the location ids freed by the removed units; unknown ids are ignored
+        freed = []
+        for unit_id in unit_ids:
+            row = self._row(unit_id)
+            if row is not None:
+                freed.append(self.location_ids[row])
+                self.location_ids[row] = self.REMOVED
+                self.count -= 1
+        if self.count * 2 < len(self.unit_ids):
+            self._compact()
+        return freed
+
+    def _compact(self):
+        live = [row for row, location_id in enumerate(self.location_ids) if location_id != self.REMOVED]
+        self.unit_ids = array("q", (self.unit_ids[row] for row in live))
+        self.location_ids = array("q", (self.location_ids[row] for row in live))
 
 class Product:
     product_count = 0
@@ -42,7 +113,12 @@ class Product:
         self.product_id = Product.product_count
         self.product_name = name
         self.units: Set[Unit] = set()
+        self.unit_store = UnitStore()  # Units received in bulk, kept as columns instead of Unit objects
         self.price = price
+        # Guards units, unit_store and reserved; reserved holds units (Unit objects or store unit ids)
+        # claimed by orders that have not committed yet
+        self.lock = Lock()
+        self.reserved: Set[Union['Unit', int]] = set()
 
     def add_unit(self, location: Location):
         new_unit = Unit(self.product_id, location)
@@ -58,51 +134,411 @@ class Product:
     def get_product_id(self) -> int:
         return self.product_id
 
+    def get_unit_count(self) -> int:
+        return len(self.units) + len(self.unit_store)
+
+    def has_unit(self, unit: Union['Unit', int]) -> bool:
+        if isinstance(unit, int):
+            return self.unit_store.get_location_id(unit) is not None
+        return unit in self.units
+
+# An order line names a unit either as a Unit object or, for units received in bulk, by its unit id
+OrderUnit = Union[Unit, int]
+
 class Order:
-    def __init__(self, products: Dict[int, List[Unit]]):
+    def __init__(self, products: Dict[int, List[OrderUnit]]):
         self.products = products
 
+class SortedIndex:
+    # (key, product_id) pairs kept sorted for bisect lookups. New pairs are buffered and merged on
+    # the next read or remove: a few (e.g. from a price update) by insort, a bulk load by one sort
+    MAX_INSORT = 256
+
+    def __init__(self):
+        self.entries: List[Tuple] = []
+        self.pending: List[Tuple] = []
+        self.lock = Lock()
+
+    def add(self, key, product_id: int):
+        with self.lock:
+            self.pending.append((key, product_id))
+
+    def remove(self, key, product_id: int):
+        with self.lock:
+            self._merge_pending()
+            i = bisect_left(self.entries, (key, product_id))
+            if i < len(self.entries) and self.entries[i] == (key, product_id):
+                del self.entries[i]
+
+    def _merge_pending(self):
+        if len(self.pending) <= self.MAX_INSORT:
+            for entry in self.pending:
+                insort(self.entries, entry)
+        else:
+            self.entries.extend(self.pending)
+            self.entries.sort()
+        self.pending = []
+
+    def between(self, low, high) -> List[int]:
+        # Product ids whose key lies in [low, high]
+        with self.lock:
+            self._merge_pending()
+            entries = self.entries
+            i = bisect_left(entries, (low,))
+            product_ids = []
+            while i < len(entries) and entries[i][0] <= high:
+                product_ids.append(entries[i][1])
+                i += 1
+            return product_ids
+
+    def with_prefix(self, prefix: str) -> List[int]:
+        # Product ids whose string key starts with prefix
+        with self.lock:
+            self._merge_pending()
+            entries = self.entries
+            i = bisect_left(entries, (prefix,))
+            product_ids = []
+            while i < len(entries) and entries[i][0].startswith(prefix):
+                product_ids.append(entries[i][1])
+                i += 1
+            return product_ids
+
 class InventorySystem:
     def __init__(self):
         self.all_products: Dict[int, Product] = {}
         self.all_locations: Dict[LocationType, List[Location]] = {}
+        self.free_locations: Dict[LocationType, Deque[Location]] = {}
+        self.locations_by_id: Dict[int, Location] = {}
         self.all_orders: List[Order] = []
+        self.orders_lock = Lock()
+        # Secondary indexes for the query methods below
+        self.products_by_name = SortedIndex()
+        self.products_by_price = SortedIndex()
+        self.free_location_counts: Dict[LocationType, int] = {}
+        self.locations_lock = Lock()
+
+    def set_location_availability(self, location: Location, is_available: bool):
+        # The flag, the count and the pool change together, so the pool never holds a freed
+        # location whose flag still says taken; a location that becomes free goes back to its pool
+        with self.locations_lock:
+            if location.is_available == is_available:
+                return
+            location.is_available = is_available
+            location_type = location.location_type
+            self.free_location_counts[location_type] += 1 if is_available else -1
+            if is_available:
+                self.free_locations[location_type].append(location)
+
+    def get_stock_count(self, product_id: int) -> int:
+        return self.all_products[product_id].get_unit_count()
+
+    def get_free_location_count(self, location_type: LocationType) -> int:
+        return self.free_location_counts.get(location_type, 0)
+
+    def find_products_by_prefix(self, prefix: str) -> List[Product]:
+        return [self.all_products[product_id] for product_id in self.products_by_name.with_prefix(prefix)]
+
+    def find_products_by_price(self, min_price: float, max_price: float) -> List[Product]:
+        return [self.all_products[product_id] for product_id in self.products_by_price.between(min_price, max_price)]
 
     def get_location_availability(self, location_type: LocationType) -> Location:
-        locations = self.all_locations.get(location_type, [])
-        for location in locations:
-            if location.get_is_available():
-                return location
-        return None
+        # Pool entries taken without going through the pool are skipped and dropped here
+        with self.locations_lock:
+            free_locations = self.free_locations.get(location_type)
+            while free_locations:
+                location = free_locations[0]
+                if location.get_is_available():
+                    return location
+                free_locations.popleft()
+            return None
+
+    def allocate_location(self, location_type: LocationType) -> Optional[Location]:
+        # Takes a free location of location_type out of its pool and marks it taken in one locked step,
+        # so concurrent receivers never get the same bin
+        with self.locations_lock:
+            free_locations = self.free_locations.get(location_type)
+            while free_locations:
+                location = free_locations.popleft()
+                if location.is_available:
+                    location.is_available = False
+                    self.free_location_counts[location_type] -= 1
+                    return location
+            return None
 
-    def create_new_product(self, product_name: str, n_units: int, price: float):
+    def create_new_product(self, product_name: str, n_units: int, price: float,
+                           location_type: LocationType = None) -> Product:
         new_product = Product(product_name, price)
         product_id = new_product.get_product_id()
-        for _ in range(n_units):
-            new_product.add_unit(None)  # Assuming no location is needed initially
         self.all_products[product_id] = new_product
+        self.products_by_name.add(product_name, product_id)
+        self.products_by_price.add(price, product_id)
+        if location_type is not None:
+            self.add_units(product_id, n_units, location_type)
+        else:
+            for _ in range(n_units):
+                new_product.add_unit(None)  # Assuming no location is needed initially
+        return new_product
+
+    def add_units(self, product_id: int, n_units: int, location_type: LocationType) -> range:
+        # Receives up to n_units into free bins of location_type and returns the new unit ids
+        product = self.all_products[product_id]
+        location_ids = array("q")
+        for _ in range(n_units):
+            location = self.allocate_location(location_type)
+            if location is None:
+                break
+            location_ids.append(location.location_id)
+        with product.lock:
+            first_unit_id = Unit.unit_count + 1
+            Unit.unit_count += len(location_ids)
+            product.unit_store.add(first_unit_id, location_ids)
+        return range(first_unit_id, first_unit_id + len(location_ids))
+
+    def remove_units(self, product_id: int, unit_ids: Iterable[int]) -> int:
+        # Removes bulk-received units, frees their bins and returns how many were removed;
+        # units reserved by an order in progress are left to that order
+        product = self.all_products[product_id]
+        with product.lock:
+            freed = product.unit_store.remove(unit_id for unit_id in unit_ids if unit_id not in product.reserved)
+        self._free_store_locations(freed)
+        return len(freed)
+
+    def _free_store_locations(self, location_ids: List[int]):
+        for location_id in location_ids:
+            self.locations_by_id[location_id].set_is_available(True)
+
+    def reserve_units(self, product: Product, units: List[OrderUnit]) -> bool:
+        with product.lock:
+            if len(set(units)) != len(units) or any(not product.has_unit(unit) or unit in product.reserved for unit in units):
+                return False
+            product.reserved.update(units)
+            return True
 
-    def create_order(self, products: Dict[int, List[Unit]]):
+    def release_units(self, product: Product, units: List[OrderUnit]):
+        with product.lock:
+            product.reserved.difference_update(units)
+
+    def create_order(self, products: Dict[int, List[OrderUnit]]) -> Order:
+        # Reserve every product's units first, one product lock at a time, then commit them all;
+        # if any reservation fails the earlier ones are released and nothing is removed
+        reserved = []
         for product_id, units in products.items():
-            product = self.all_products[product_id]
-            for unit in units:
-                product.remove_unit(unit)
+            product = self.all_products.get(product_id)
+            if product is None or not self.reserve_units(product, units):
+                for reserved_product, reserved_units in reserved:
+                    self.release_units(reserved_product, reserved_units)
+                raise ValueError(f'Units of product {product_id} are not available.')
+            reserved.append((product, units))
+
+        for product, units in reserved:
+            with product.lock:
+                store_unit_ids = []
+                for unit in units:
+                    if isinstance(unit, int):
+                        store_unit_ids.append(unit)
+                    else:
+                        product.remove_unit(unit)
+                freed = product.unit_store.remove(store_unit_ids)
+                product.reserved.difference_update(units)
+            self._free_store_locations(freed)
         order = Order(products)
-        self.all_orders.append(order)
+        with self.orders_lock:
+            self.all_orders.append(order)
+        return order
 
-    def update_product(self, price: float, product_id: int) -> Product:
+    def update_product_price(self, price: float, product_id: int) -> Product:
         product = self.all_products[product_id]
-        product.set_price(price)
+        with product.lock:
+            self.products_by_price.remove(product.price, product_id)
+            product.set_price(price)
+            self.products_by_price.add(price, product_id)
         return product
 
     def update_product(self, n_units: int, product_id: int, location_type: LocationType) -> Product:
         product = self.all_products[product_id]
         for _ in range(n_units):
-            location = self.get_location_availability(location_type)
+            location = self.allocate_location(location_type)
             if location:
                 product.add_unit(location)
         return product
 
-    def create_locations(self):
-        # Implementation not provided in the original code
-        pass
\ No newline at end of file
+    def create_locations(self, location_type: LocationType, n_locations: int) -> List[Location]:
+        locations = [Location(location_type) for _ in range(n_locations)]
+        for location in locations:
+            location.inventory = self
+        with self.locations_lock:
+            self.free_locations.setdefault(location_type, deque()).extend(locations)
+            self.free_location_counts[location_type] = self.free_location_counts.get(location_type, 0) + n_locations
+        self.all_locations.setdefault(location_type, []).extend(locations)
+        self.locations_by_id.update((location.location_id, location) for location in locations)
+        return locations
+
+def benchmark_receiving(n_units: int = 1_000_000, legacy_units: int = 10_000):
+    inventory = InventorySystem()
+    product = Product("Widget", 1.0)
+    inventory.all_products[product.get_product_id()] = product
+
+    started = time.perf_counter()
+    inventory.create_locations(LocationType.SMALL, n_units)
+    provisioned = time.perf_counter() - started
+    started = time.perf_counter()
+    inventory.update_product(n_units, product.get_product_id(), LocationType.SMALL)
+    received = time.perf_counter() - started
+    assert len(product.units) == n_units and inventory.get_location_availability(LocationType.SMALL) is None
+    print(f"{n_units} bins provisioned in {provisioned:.2f}s, {n_units} units received in {received:.2f}s "
+          f"({n_units / received:.0f} units/s)")
+
+    # The previous allocator scanned all_locations from the start for every unit
+    locations = [Location(LocationType.SMALL) for _ in range(legacy_units)]
+    started = time.perf_counter()
+    for _ in range(legacy_units):
+        location = next(location for location in locations if location.get_is_available())
+        product.add_unit(location)
+    legacy = time.perf_counter() - started
+    print(f"linear scan: {legacy_units} units into {legacy_units} bins in {legacy:.2f}s ({legacy_units / legacy:.0f} units/s)")
+
+def benchmark_unit_storage(n_units: int = 1_000_000):
+    inventory = InventorySystem()
+    inventory.create_locations(LocationType.SMALL, 2 * n_units)
+
+    tracemalloc.start()
+    objects = Product("Objects", 1.0)
+    inventory.all_products[objects.get_product_id()] = objects
+    inventory.update_product(n_units, objects.get_product_id(), LocationType.SMALL)
+    object_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    columns = inventory.create_new_product("Columns", n_units, 1.0, LocationType.SMALL)
+    received = time.perf_counter() - started
+    column_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    unit_ids = [unit_id for unit_id, _ in columns.unit_store]
+    started = time.perf_counter()
+    removed = inventory.remove_units(columns.get_product_id(), unit_ids[::2])
+    removal = time.perf_counter() - started
+    assert removed == len(unit_ids[::2]) and columns.get_unit_count() == n_units - removed
+    print(f"{n_units} units: Unit objects {object_bytes / n_units:.0f} B/unit, unit store {column_bytes / n_units:.0f} B/unit; "
+          f"add_units {n_units / received:.0f} units/s, remove_units {removed / removal:.0f} units/s")
+
+@contextmanager
+def _frequent_thread_switches():
+    # Switches threads as often as possible to expose races, then restores the old interval
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        yield
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+def stress_test_orders(n_products: int = 100, units_per_product: int = 1_000, n_orders: int = 20_000,
+                       workers: int = 16, units_per_order: int = 3):
+    inventory = InventorySystem()
+    inventory.create_locations(LocationType.MEDIUM, n_products * units_per_product)
+    products = []
+    all_units = {}
+    for i in range(n_products):
+        # Half the units are Unit objects and half are received in bulk into the unit store
+        product = inventory.create_new_product(f"Product{i}", 0, 1.0)
+        inventory.update_product(units_per_product // 2, product.get_product_id(), LocationType.MEDIUM)
+        store_unit_ids = inventory.add_units(product.get_product_id(), units_per_product - units_per_product // 2, LocationType.MEDIUM)
+        all_units[product.get_product_id()] = list(product.units) + list(store_unit_ids)
+        products.append(product)
+
+    # Orders draw from the same units, so many of them conflict and must fail cleanly
+    rng = random.Random(5)
+    orders = []
+    for _ in range(n_orders):
+        chosen = rng.sample(products, 2)
+        orders.append({product.get_product_id(): rng.sample(all_units[product.get_product_id()], units_per_order)
+                       for product in chosen})
+
+    def place(order):
+        try:
+            inventory.create_order(order)
+            return True
+        except ValueError:
+            return False
+
+    with _frequent_thread_switches():
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as executor:
+            placed = list(executor.map(place, orders))
+        elapsed = time.perf_counter() - started
+
+    sold = [unit for order, ok in zip(orders, placed) if ok for units in order.values() for unit in units]
+    assert len(sold) == len(set(sold)), "unit sold twice"
+    assert len(inventory.all_orders) == sum(placed)
+    sold_by_product = {}
+    for order, ok in zip(orders, placed):
+        if ok:
+            for product_id, units in order.items():
+                sold_by_product[product_id] = sold_by_product.get(product_id, 0) + len(units)
+    for product in products:
+        assert not product.reserved
+        assert product.get_unit_count() == units_per_product - sold_by_product.get(product.get_product_id(), 0)
+    free_bins = sum(1 for location in inventory.all_locations[LocationType.MEDIUM] if location.get_is_available())
+    assert free_bins == len(sold)
+    print(f"{n_orders} orders on {workers} threads: {sum(placed)} placed, {n_orders - sum(placed)} rejected, "
+          f"{n_orders / elapsed:.0f} orders/s")
+
+def benchmark_queries(n_products: int = 1_000_000, n_queries: int = 1_000):
+    inventory = InventorySystem()
+    inventory.create_locations(LocationType.SMALL, 1_000)
+    rng = random.Random(11)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    started = time.perf_counter()
+    for _ in range(n_products):
+        name = "".join(rng.choice(letters) for _ in range(8))
+        inventory.create_new_product(name, 0, round(rng.uniform(1, 1_000), 2))
+    print(f"{n_products} products created in {time.perf_counter() - started:.2f}s")
+    products = list(inventory.all_products.values())
+    product_ids = list(inventory.all_products)
+
+    started = time.perf_counter()
+    inventory.find_products_by_prefix("a")  # First read sorts the buffered index entries
+    inventory.find_products_by_price(0, 0)
+    print(f"indexes built in {time.perf_counter() - started:.2f}s")
+
+    for product_id in rng.sample(product_ids, n_queries):
+        inventory.update_product_price(round(rng.uniform(1, 1_000), 2), product_id)
+    inventory.update_product(100, product_ids[0], LocationType.SMALL)
+
+    prefixes = ["".join(rng.choice(letters) for _ in range(3)) for _ in range(n_queries)]
+    ranges = [(low, low + 1) for low in (rng.uniform(1, 1_000) for _ in range(n_queries))]
+    stock_ids = rng.sample(product_ids, n_queries)
+    queries = [
+        ("stock count", lambda i: inventory.get_stock_count(stock_ids[i]),
+         lambda i: sum(1 for unit in inventory.all_products[stock_ids[i]].units) + len(inventory.all_products[stock_ids[i]].unit_store)),
+        ("free bins", lambda i: inventory.get_free_location_count(LocationType.SMALL),
+         lambda i: sum(1 for location in inventory.all_locations[LocationType.SMALL] if location.get_is_available())),
+        ("name prefix", lambda i: inventory.find_products_by_prefix(prefixes[i]),
+         lambda i: [product for product in products if product.product_name.startswith(prefixes[i])]),
+        ("price range", lambda i: inventory.find_products_by_price(*ranges[i]),
+         lambda i: [product for product in products if ranges[i][0] <= product.price <= ranges[i][1]]),
+    ]
+    for label, indexed, scan in queries:
+        started = time.perf_counter()
+        for i in range(n_queries):
+            indexed(i)
+        indexed_time = (time.perf_counter() - started) / n_queries
+        # Full scans are slow at this size, so only a few are timed and checked against the index
+        scans = 5
+        started = time.perf_counter()
+        for i in range(scans):
+            expected = scan(i)
+        scan_time = (time.perf_counter() - started) / scans
+        for i in range(scans):
+            expected, result = scan(i), indexed(i)
+            if isinstance(expected, list):
+                expected, result = sorted(p.product_id for p in expected), sorted(p.product_id for p in result)
+            assert result == expected, label
+        print(f"{label}: indexed {indexed_time * 1e6:.1f}us vs scan {scan_time * 1e3:.2f}ms per query")
+
+if __name__ == "__main__":
+    benchmark_receiving()
+    benchmark_unit_storage()
+    stress_test_orders()
+    benchmark_queries()
@@ -1,3 +1,9 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+import random
+import time
+
+
 class Meeting:
     def __init__(self, meeting_id, title, start_time, end_time, attendees):
         self.meeting_id = meeting_id
@@ -12,37 +18,111 @@ class Meeting:
 
 class MeetingManager:
     def __init__(self):
-        self.meetings = []  # List to store Meeting objects
+        self.meetings = {}  # meeting_id -> Meeting, in creation order
+        # (start_time, end_time, meeting_id) of every meeting, sorted. Stored meetings never
+        # overlap, so end times are sorted as well and an overlap check only walks back
+        # from the first meeting that starts after the new one ends.
+        self.start_index = []
+        self.index_keys = {}  # meeting_id -> its start_index entry
 
     def create_meeting(self, meeting):
+        if meeting.meeting_id in self.meetings:
+            raise ValueError('Meeting already exists.')
         if self.check_overlap(meeting):
             raise ValueError('Meeting time overlaps with an existing meeting.')
-        self.meetings.append(meeting)
+        self.meetings[meeting.meeting_id] = meeting
+        self._index(meeting)
 
     def update_meeting(self, updated_meeting):
-        for i, meeting in enumerate(self.meetings):
-            if meeting.meeting_id == updated_meeting.meeting_id:
-                if self.check_overlap(updated_meeting, skip_index=i):
-                    raise ValueError('Meeting time overlaps with an existing meeting.')
-                self.meetings[i] = updated_meeting
-                return
-        raise ValueError('Meeting not found.')
+        if updated_meeting.meeting_id not in self.meetings:
+            raise ValueError('Meeting not found.')
+        if self.check_overlap(updated_meeting, skip_id=updated_meeting.meeting_id):
+            raise ValueError('Meeting time overlaps with an existing meeting.')
+        self._unindex(updated_meeting.meeting_id)
+        self.meetings[updated_meeting.meeting_id] = updated_meeting
+        self._index(updated_meeting)
 
     def delete_meeting(self, meeting_id):
-        for i, meeting in enumerate(self.meetings):
-            if meeting.meeting_id == meeting_id:
-                self.meetings.pop(i)
-                return
-        raise ValueError('Meeting not found.')
+        if meeting_id not in self.meetings:
+            raise ValueError('Meeting not found.')
+        self._unindex(meeting_id)
+        del self.meetings[meeting_id]
 
     def get_meetings(self):
-        return self.meetings
-
-    def check_overlap(self, new_meeting, skip_index=None):
-        for i, existing_meeting in enumerate(self.meetings):
-            if skip_index is not None and i == skip_index:
-                continue  # Skip the meeting being updated
-            if (new_meeting.start_time < existing_meeting.end_time and
-                    new_meeting.end_time > existing_meeting.start_time):
+        return list(self.meetings.values())
+
+    def check_overlap(self, new_meeting, skip_id=None):
+        # Every meeting left of i starts before new_meeting ends; walking back, the first one that
+        # also ends after new_meeting starts overlaps it, and once one ends earlier all the rest do
+        i = bisect_left(self.start_index, (new_meeting.end_time,))
+        while i > 0:
+            i -= 1
+            _, end_time, meeting_id = self.start_index[i]
+            if end_time <= new_meeting.start_time:
+                break
+            if meeting_id != skip_id:
                 return True  # Overlapping meeting found
         return False  # No overlap
+
+    def _index(self, meeting):
+        # The key is kept so the entry can be found even if the Meeting is later edited in place
+        key = (meeting.start_time, meeting.end_time, meeting.meeting_id)
+        insort(self.start_index, key)
+        self.index_keys[meeting.meeting_id] = key
+
+    def _unindex(self, meeting_id):
+        key = self.index_keys.pop(meeting_id)
+        del self.start_index[bisect_left(self.start_index, key)]
+
+
+def benchmark(n_meetings=100_000, legacy_meetings=5_000):
+    # Half-hour slots booked in random order, each followed by a clashing request that is rejected
+    rng = random.Random(3)
+    day = datetime(2024, 1, 1)
+    slots = list(range(n_meetings))
+    rng.shuffle(slots)
+
+    def meeting(meeting_id, slot, offset=timedelta()):
+        start = day + timedelta(minutes=30 * slot) + offset
+        return Meeting(meeting_id, f'Meeting {meeting_id}', start, start + timedelta(minutes=30), [])
+
+    manager = MeetingManager()
+    rejected = 0
+    started = time.perf_counter()
+    for meeting_id, slot in enumerate(slots):
+        manager.create_meeting(meeting(meeting_id, slot))
+        try:
+            manager.create_meeting(meeting(n_meetings + meeting_id, slot, timedelta(minutes=15)))
+        except ValueError:
+            rejected += 1
+    elapsed = time.perf_counter() - started
+    assert rejected == n_meetings and len(manager.meetings) == n_meetings
+    print(f'{n_meetings} meetings created in {elapsed:.2f}s ({n_meetings / elapsed:.0f}/s), '
+          f'{rejected} clashing requests rejected')
+
+    # Move every meeting to a free slot past the end of the calendar, then delete them all
+    started = time.perf_counter()
+    for meeting_id, slot in enumerate(slots):
+        manager.update_meeting(meeting(meeting_id, slot + n_meetings))
+    update_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    for meeting_id in range(n_meetings):
+        manager.delete_meeting(meeting_id)
+    delete_elapsed = time.perf_counter() - started
+    assert not manager.meetings and not manager.start_index
+    print(f'{n_meetings} updates in {update_elapsed:.2f}s, {n_meetings} deletes in {delete_elapsed:.2f}s')
+
+    # The old list-based manager compared each new meeting with every stored one
+    meetings = []
+    started = time.perf_counter()
+    for meeting_id, slot in enumerate(slots[:legacy_meetings]):
+        new_meeting = meeting(meeting_id, slot)
+        assert not any(new_meeting.start_time < existing.end_time and new_meeting.end_time > existing.start_time
+                       for existing in meetings)
+        meetings.append(new_meeting)
+    elapsed = time.perf_counter() - started
+    print(f'linear scan: {legacy_meetings} meetings created in {elapsed:.2f}s ({legacy_meetings / elapsed:.0f}/s)')
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,6 +1,15 @@
+from bisect import bisect_left, insort
+from collections import deque
 from enum import Enum
-from typing import Dict, List, Set
-from datetime import datetime
+from itertools import count
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import os
+import random
+import struct
+import tempfile
+import time
+import tracemalloc
 
 class VehicleType(Enum):
     BIKE = 1
@@ -19,10 +28,22 @@ class Vehicle:
         self.vehicle_id = vehicle_id
         self.type = vehicle_type
 
+def get_slot_type_for_vehicle(vehicle: Vehicle) -> ParkingSlotType:
+    if vehicle.type == VehicleType.BIKE:
+        return ParkingSlotType.TWOWHEELER
+    elif vehicle.type == VehicleType.SEDAN:
+        return ParkingSlotType.SMALL
+    elif vehicle.type == VehicleType.SUV:
+        return ParkingSlotType.MEDIUM
+    else:
+        return ParkingSlotType.LARGE
+
 class ParkingSlot:
     def __init__(self, name: str):
         self.name = name
         self.parking_slot_type = None
+        self.parking_floor = None
+        self.slot_index = None  # Position within the floor's list for its slot type
         self.vehicle = None
         self.is_available = True
 
@@ -40,43 +61,136 @@ class ParkingSlot:
 class ParkingFloor:
     def __init__(self, name: str):
         self.parking_floor_name = name
+        self.parking_lot = None
         self.parking_slots: Dict[ParkingSlotType, List[ParkingSlot]] = {}
+        # Free slots per type, and the slot each parked vehicle holds. Slots are handed out from the head and
+        # freed slots rejoin at the tail, so reuse is FIFO rather than the lowest-index-first order of a scan
+        self.free_slots: Dict[ParkingSlotType, Deque[ParkingSlot]] = {}
+        self.vehicle_slots: Dict[Vehicle, ParkingSlot] = {}
 
     def get_parking_slot_type(self, vehicle: Vehicle) -> ParkingSlotType:
-        if vehicle.type == VehicleType.BIKE:
-            return ParkingSlotType.TWOWHEELER
-        elif vehicle.type == VehicleType.SEDAN:
-            return ParkingSlotType.SMALL
-        elif vehicle.type == VehicleType.SUV:
-            return ParkingSlotType.MEDIUM
-        else:
-            return ParkingSlotType.LARGE
+        return get_slot_type_for_vehicle(vehicle)
 
     def add_parking_slots(self, parking_slot: ParkingSlot, parking_slot_type: ParkingSlotType):
         if parking_slot_type not in self.parking_slots:
             self.parking_slots[parking_slot_type] = []
+            self.free_slots[parking_slot_type] = deque()
+        parking_slot.parking_slot_type = parking_slot_type
+        parking_slot.parking_floor = self
+        parking_slot.slot_index = len(self.parking_slots[parking_slot_type])
         self.parking_slots[parking_slot_type].append(parking_slot)
+        if parking_slot.is_available:
+            free_slots = self.free_slots[parking_slot_type]
+            free_slots.append(parking_slot)
+            if len(free_slots) == 1:
+                self._notify_availability(parking_slot_type)
+        if self.parking_lot is not None:
+            self.parking_lot.layout_changed()
+
+    def _notify_availability(self, parking_slot_type: ParkingSlotType):
+        # Only called when a type's free-list goes from empty to non-empty or back
+        if self.parking_lot is not None:
+            self.parking_lot.update_floor_availability(self, parking_slot_type)
 
     def assign_slot(self, vehicle: Vehicle) -> ParkingSlot:
-        parking_slot_type = self.get_parking_slot_type(vehicle)
-        for parking_slot in self.parking_slots.get(parking_slot_type, []):
-            if parking_slot.is_available:
-                parking_slot.add_vehicle(vehicle)
-                return parking_slot
-        return None
+        free_slots = self.free_slots.get(self.get_parking_slot_type(vehicle))
+        if not free_slots:
+            return None
+        parking_slot = free_slots.popleft()
+        parking_slot.add_vehicle(vehicle)
+        self.vehicle_slots[vehicle] = parking_slot
+        if not free_slots:
+            self._notify_availability(parking_slot.get_parking_slot_type())
+        return parking_slot
 
     def remove_slot(self, vehicle: Vehicle):
-        for slots in self.parking_slots.values():
-            for slot in slots:
-                if slot.vehicle == vehicle:
-                    slot.remove_vehicle()
-                    return
+        slot = self.vehicle_slots.pop(vehicle, None)
+        if slot is not None:
+            slot.remove_vehicle()
+            free_slots = self.free_slots[slot.get_parking_slot_type()]
+            free_slots.append(slot)
+            if len(free_slots) == 1:
+                self._notify_availability(slot.get_parking_slot_type())
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MINUTE = timedelta(minutes=1)
+MINUTES_PER_DAY = 24 * 60
+
+class Tariff:
+    def __init__(self, hourly_rates: Dict[ParkingSlotType, float], default_rate: float = 0.0,
+                 bands: Optional[List[Tuple[int, int, float]]] = None, daily_cap: Optional[float] = None,
+                 grace_minutes: float = 0):
+        self.hourly_rates = hourly_rates
+        self.default_rate = default_rate
+        # (start_hour, end_hour, multiplier) with hours in 0..24, wrapping past midnight when start_hour > end_hour;
+        # 24 is midnight, and a band that starts and ends at the same hour covers the whole day
+        self.bands = bands or []
+        self.daily_cap = daily_cap
+        self.grace_minutes = grace_minutes
+
+        multipliers = [1.0] * 24
+        for start_hour, end_hour, multiplier in self.bands:
+            if not (0 <= start_hour <= 24 and 0 <= end_hour <= 24):
+                raise ValueError(f"Tariff band hours must be between 0 and 24, got ({start_hour}, {end_hour}).")
+            length = (end_hour - start_hour) % 24 or 24
+            for hour in range(start_hour, start_hour + length):
+                multipliers[hour % 24] = multiplier
+        # Per slot type: price per minute for each hour of the day, and the cumulative price from midnight to each hour
+        self.rate_tables: Dict[Optional[ParkingSlotType], Tuple[List[float], List[float]]] = {}
+        for parking_slot_type, hourly_rate in list(hourly_rates.items()) + [(None, default_rate)]:
+            per_minute = [hourly_rate * multiplier / 60 for multiplier in multipliers]
+            cumulative = [0.0]
+            for rate in per_minute:
+                cumulative.append(cumulative[-1] + rate * 60)
+            self.rate_tables[parking_slot_type] = (per_minute, cumulative)
+
+    def _cost_since_midnight(self, table: Tuple[List[float], List[float]], minute: float) -> float:
+        per_minute, cumulative = table
+        hour = min(int(minute // 60), 23)
+        return cumulative[hour] + (minute - hour * 60) * per_minute[hour]
+
+    def _day_cost(self, table: Tuple[List[float], List[float]], start_minute: float, end_minute: float) -> float:
+        cost = self._cost_since_midnight(table, end_minute) - self._cost_since_midnight(table, start_minute)
+        return cost if self.daily_cap is None else min(cost, self.daily_cap)
+
+    def price_minutes(self, parking_slot_type: Optional[ParkingSlotType], start: float, end: float) -> float:
+        # start and end are minutes since EPOCH, which falls on a midnight
+        if end - start <= self.grace_minutes:
+            return 0.0
+        table = self.rate_tables.get(parking_slot_type, self.rate_tables[None])
+        start_day, start_minute = divmod(start, MINUTES_PER_DAY)
+        end_day, end_minute = divmod(end, MINUTES_PER_DAY)
+        if start_day == end_day:
+            return self._day_cost(table, start_minute, end_minute)
+        full_days = end_day - start_day - 1
+        return (self._day_cost(table, start_minute, MINUTES_PER_DAY)
+                + full_days * self._day_cost(table, 0, MINUTES_PER_DAY)
+                + self._day_cost(table, 0, end_minute))
+
+    def price(self, parking_slot_type: Optional[ParkingSlotType], start_time: datetime, end_time: datetime) -> float:
+        return self.price_minutes(parking_slot_type, (start_time - EPOCH) / ONE_MINUTE, (end_time - EPOCH) / ONE_MINUTE)
+
+    def price_tickets(self, tickets: Iterable['Ticket']) -> List[float]:
+        # End-of-day settlement of closed tickets: durations are computed once as epoch minutes, then priced from the tables
+        tickets = list(tickets)
+        starts = [(ticket.start_time - EPOCH) / ONE_MINUTE for ticket in tickets]
+        ends = [(ticket.end_time - EPOCH) / ONE_MINUTE for ticket in tickets]
+        slot_types = [ticket.parking_slot.get_parking_slot_type() for ticket in tickets]
+        return list(map(self.price_minutes, slot_types, starts, ends))
+
+DEFAULT_TARIFF = Tariff({
+    ParkingSlotType.TWOWHEELER: 0.02,
+    ParkingSlotType.SMALL: 0.03,
+    ParkingSlotType.MEDIUM: 0.04,
+    ParkingSlotType.LARGE: 0.05,
+}, default_rate=0.01)
 
 class Ticket:
-    def __init__(self, ticket_id: int, vehicle: Vehicle, parking_slot: ParkingSlot):
+    def __init__(self, ticket_id: int, vehicle: Vehicle, parking_slot: ParkingSlot, tariff: Tariff = DEFAULT_TARIFF):
         self.ticket_id = ticket_id
         self.vehicle = vehicle
         self.parking_slot = parking_slot
+        self.tariff = tariff
         self.start_time = datetime.now()
         self.end_time = None
 
@@ -87,17 +201,8 @@ class Ticket:
         return duration
 
     def calculate_price(self) -> float:
-        duration = self.calculate_duration()
-        price_per_hour = 0.01
-        if self.parking_slot.get_parking_slot_type() == ParkingSlotType.TWOWHEELER:
-            price_per_hour += 0.01
-        elif self.parking_slot.get_parking_slot_type() == ParkingSlotType.SMALL:
-            price_per_hour += 0.02
-        elif self.parking_slot.get_parking_slot_type() == ParkingSlotType.MEDIUM:
-            price_per_hour += 0.03
-        elif self.parking_slot.get_parking_slot_type() == ParkingSlotType.LARGE:
-            price_per_hour += 0.04
-        return duration * price_per_hour
+        self.calculate_duration()
+        return self.tariff.price(self.parking_slot.get_parking_slot_type(), self.start_time, self.end_time)
 
     def get_ticket_parking_slot(self) -> ParkingSlot:
         return self.parking_slot
@@ -111,6 +216,16 @@ class ParkingLot:
         else:
             self.parking_lot_name = name
             self.parking_floors: Set[ParkingFloor] = set()
+            # Floors are preferred in the order they were added; available_floors holds, per slot
+            # type, the sorted positions of floors that have at least one free slot of that type
+            self.floor_positions: Dict[ParkingFloor, int] = {}
+            self.floors_by_position: Dict[int, ParkingFloor] = {}
+            self.available_floors: Dict[ParkingSlotType, List[int]] = {}
+            self.floor_counter = count()
+            self.last_ticket_id = 0
+            self.open_tickets: Dict[int, Ticket] = {}
+            self.tariff = DEFAULT_TARIFF
+            self.journal = None
             ParkingLot._instance = self
 
     @staticmethod
@@ -120,21 +235,391 @@ class ParkingLot:
         return ParkingLot._instance
 
     def add_floor(self, floor: ParkingFloor):
+        if floor in self.parking_floors:
+            return
         self.parking_floors.add(floor)
+        position = next(self.floor_counter)
+        self.floor_positions[floor] = position
+        self.floors_by_position[position] = floor
+        floor.parking_lot = self
+        for parking_slot_type in floor.free_slots:
+            self.update_floor_availability(floor, parking_slot_type)
+        self.layout_changed()
 
     def remove_floor(self, floor: ParkingFloor):
+        if floor.vehicle_slots:
+            raise ValueError('Floor still has parked vehicles.')
         self.parking_floors.remove(floor)
+        position = self.floor_positions.pop(floor)
+        del self.floors_by_position[position]
+        floor.parking_lot = None
+        for positions in self.available_floors.values():
+            index = bisect_left(positions, position)
+            if index < len(positions) and positions[index] == position:
+                del positions[index]
+        self.layout_changed()
+
+    def layout_changed(self):
+        # The journal only records tickets, so a journaled lot snapshots every change to its floors or slots
+        if self.journal is not None:
+            self.journal.snapshot()
+
+    def update_floor_availability(self, floor: ParkingFloor, parking_slot_type: ParkingSlotType):
+        position = self.floor_positions[floor]
+        positions = self.available_floors.setdefault(parking_slot_type, [])
+        index = bisect_left(positions, position)
+        listed = index < len(positions) and positions[index] == position
+        if floor.free_slots.get(parking_slot_type) and not listed:
+            insort(positions, position)
+        elif not floor.free_slots.get(parking_slot_type) and listed:
+            del positions[index]
+
+    def get_availability(self) -> Dict[str, Dict[ParkingSlotType, int]]:
+        return {self.floors_by_position[position].parking_floor_name:
+                    {parking_slot_type: len(free_slots) for parking_slot_type, free_slots in self.floors_by_position[position].free_slots.items()}
+                for position in sorted(self.floors_by_position)}
 
     def get_parking_slot(self, vehicle: Vehicle) -> Ticket:
-        for parking_floor in self.parking_floors:
-            parking_slot = parking_floor.assign_slot(vehicle)
-            if parking_slot is not None:
-                return Ticket(len(self.parking_floors), vehicle, parking_slot)
-        return None
+        positions = self.available_floors.get(get_slot_type_for_vehicle(vehicle))
+        if not positions:
+            return None
+        floor = self.floors_by_position[positions[0]]
+        # The ticket names the slot assign_slot is about to hand out, so its journal record can be
+        # written first; if packing or writing fails the lot is left unchanged
+        ticket = Ticket(self.last_ticket_id + 1, vehicle, floor.free_slots[get_slot_type_for_vehicle(vehicle)][0], self.tariff)
+        if self.journal is not None:
+            self.journal.record_assign(ticket)
+        floor.assign_slot(vehicle)
+        self.last_ticket_id = ticket.ticket_id
+        self.open_tickets[ticket.ticket_id] = ticket
+        if self.journal is not None:
+            self.journal.snapshot_if_due()
+        return ticket
+
+    def set_tariff(self, tariff: Tariff):
+        self.tariff = tariff
 
     def remove_parking_slot(self, ticket: Ticket) -> float:
         price = ticket.calculate_price()
         vehicle = ticket.vehicle
         parking_slot = ticket.get_ticket_parking_slot()
-        parking_slot.remove_vehicle()
-        return price
\ No newline at end of file
+        if parking_slot.parking_floor is not None:
+            parking_slot.parking_floor.remove_slot(vehicle)
+        else:
+            parking_slot.remove_vehicle()
+        if self.open_tickets.pop(ticket.ticket_id, None) is not None and self.journal is not None:
+            self.journal.record_remove(ticket)
+        return price
+
+def to_micros(moment: datetime) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+class LotJournal:
+    # Journal records: an assign names the slot it was given so replay can verify it; a remove names the ticket
+    ASSIGN = struct.Struct("<BqqBqqBI")  # kind, ticket_id, vehicle_id, vehicle_type, start_us, floor_position, slot_type, slot_index
+    REMOVE = struct.Struct("<Bqq")  # kind, ticket_id, end_us
+    ASSIGN_KIND = 1
+    REMOVE_KIND = 2
+
+    # Snapshot: header, lot name, floors (layout plus free-list order), then open tickets as ASSIGN records
+    HEADER = struct.Struct("<4sHqqI")  # magic, version, last_ticket_id, journal_offset, floor_count
+    FLOOR = struct.Struct("<qB")  # position, slot type count
+    SLOT_TYPE = struct.Struct("<BII")  # slot type, slot count, free slot count
+    MAGIC = b"PLSN"
+    VERSION = 1
+
+    def __init__(self, parking_lot: ParkingLot, journal_path: str, snapshot_path: str,
+                 snapshot_every: int = 100_000, sync: bool = False):
+        self.parking_lot = parking_lot
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+        self.records_since_snapshot = 0
+        self.journal_file = open(journal_path, "ab")
+        parking_lot.journal = self
+
+    def close(self):
+        self.journal_file.close()
+        self.parking_lot.journal = None
+
+    def _write(self, record: bytes):
+        self.journal_file.write(record)
+        self.journal_file.flush()
+        if self.sync:
+            os.fsync(self.journal_file.fileno())
+        self.records_since_snapshot += 1
+
+    def snapshot_if_due(self):
+        if self.snapshot_every and self.records_since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def record_assign(self, ticket: Ticket):
+        # Written before the lot changes; the lot calls snapshot_if_due once the ticket is open
+        self._write(self._pack_assign(ticket))
+
+    def record_remove(self, ticket: Ticket):
+        self._write(self.REMOVE.pack(self.REMOVE_KIND, ticket.ticket_id, to_micros(ticket.end_time)))
+        self.snapshot_if_due()
+
+    def _pack_assign(self, ticket: Ticket) -> bytes:
+        slot = ticket.parking_slot
+        return self.ASSIGN.pack(self.ASSIGN_KIND, ticket.ticket_id, ticket.vehicle.vehicle_id, ticket.vehicle.type.value,
+                                to_micros(ticket.start_time), self.parking_lot.floor_positions[slot.parking_floor],
+                                slot.parking_slot_type.value, slot.slot_index)
+
+    @staticmethod
+    def _pack_str(value: str) -> bytes:
+        encoded = value.encode()
+        return struct.pack("<H", len(encoded)) + encoded
+
+    def snapshot(self):
+        lot = self.parking_lot
+        chunks = [self.HEADER.pack(self.MAGIC, self.VERSION, lot.last_ticket_id, self.journal_file.tell(), len(lot.floors_by_position)),
+                  self._pack_str(lot.parking_lot_name)]
+        for position in sorted(lot.floors_by_position):
+            floor = lot.floors_by_position[position]
+            chunks.append(self.FLOOR.pack(position, len(floor.parking_slots)))
+            chunks.append(self._pack_str(floor.parking_floor_name))
+            for parking_slot_type, slots in floor.parking_slots.items():
+                free_slots = floor.free_slots[parking_slot_type]
+                chunks.append(self.SLOT_TYPE.pack(parking_slot_type.value, len(slots), len(free_slots)))
+                chunks.extend(self._pack_str(slot.name) for slot in slots)
+                chunks.append(struct.pack(f"<{len(free_slots)}I", *(slot.slot_index for slot in free_slots)))
+        chunks.append(struct.pack("<I", len(lot.open_tickets)))
+        chunks.extend(self._pack_assign(ticket) for ticket in lot.open_tickets.values())
+
+        # Written beside the old snapshot and renamed over it, so a crash never leaves a partial snapshot
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self.records_since_snapshot = 0
+
+    @classmethod
+    def recover(cls, journal_path: str, snapshot_path: str, replace_existing: bool = False, **kwargs) -> 'LotJournal':
+        # Rebuilds the lot from the snapshot, replays the journal past the snapshot's offset and reattaches the journal.
+        # ParkingLot is a singleton, so an existing lot is only replaced when replace_existing is set, and is
+        # restored if recovery fails.
+        existing = ParkingLot._instance
+        if existing is not None and not replace_existing:
+            raise ValueError("A ParkingLot already exists in this process; pass replace_existing=True to replace it.")
+        ParkingLot._instance = None
+        try:
+            return cls._recover(journal_path, snapshot_path, **kwargs)
+        except BaseException:
+            ParkingLot._instance = existing
+            raise
+
+    @classmethod
+    def _recover(cls, journal_path: str, snapshot_path: str, **kwargs) -> 'LotJournal':
+        with open(snapshot_path, "rb") as f:
+            data = f.read()
+        magic, version, last_ticket_id, journal_offset, floor_count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{snapshot_path} is not a version {cls.VERSION} parking lot snapshot.")
+        offset = cls.HEADER.size
+
+        def read_str():
+            nonlocal offset
+            (length,) = struct.unpack_from("<H", data, offset)
+            offset += 2 + length
+            return data[offset - length:offset].decode()
+
+        lot = ParkingLot(read_str())
+        for _ in range(floor_count):
+            position, type_count = cls.FLOOR.unpack_from(data, offset)
+            offset += cls.FLOOR.size
+            floor = ParkingFloor(read_str())
+            for _ in range(type_count):
+                type_value, slot_count, free_count = cls.SLOT_TYPE.unpack_from(data, offset)
+                offset += cls.SLOT_TYPE.size
+                parking_slot_type = ParkingSlotType(type_value)
+                for _ in range(slot_count):
+                    floor.add_parking_slots(ParkingSlot(read_str()), parking_slot_type)
+                slots = floor.parking_slots[parking_slot_type]
+                free_indices = struct.unpack_from(f"<{free_count}I", data, offset)
+                offset += 4 * free_count
+                # Occupied slots are marked by the open tickets below; the free-list keeps its snapshot order
+                for slot in slots:
+                    slot.is_available = False
+                floor.free_slots[parking_slot_type] = deque(slots[index] for index in free_indices)
+                for slot in floor.free_slots[parking_slot_type]:
+                    slot.is_available = True
+            lot.floor_counter = count(position)
+            lot.add_floor(floor)
+        lot.floor_counter = count(max(lot.floors_by_position, default=-1) + 1)
+
+        (ticket_count,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        for _ in range(ticket_count):
+            ticket_id, vehicle_id, vehicle_type, start_us, position, type_value, slot_index = cls.ASSIGN.unpack_from(data, offset)[1:]
+            offset += cls.ASSIGN.size
+            floor = lot.floors_by_position[position]
+            slot = floor.parking_slots[ParkingSlotType(type_value)][slot_index]
+            vehicle = Vehicle(vehicle_id, VehicleType(vehicle_type))
+            slot.add_vehicle(vehicle)
+            floor.vehicle_slots[vehicle] = slot
+            cls._open_ticket(lot, ticket_id, vehicle, slot, start_us)
+        lot.last_ticket_id = last_ticket_id
+
+        with open(journal_path, "rb") as f:
+            f.seek(journal_offset)
+            journal = f.read()
+        replayed = cls._replay(lot, journal)
+        # Cut off a torn final record so new records follow the last complete one
+        if replayed < len(journal):
+            with open(journal_path, "r+b") as f:
+                f.truncate(journal_offset + replayed)
+        return cls(lot, journal_path, snapshot_path, **kwargs)
+
+    @staticmethod
+    def _open_ticket(lot: ParkingLot, ticket_id: int, vehicle: Vehicle, slot: ParkingSlot, start_us: int):
+        ticket = Ticket(ticket_id, vehicle, slot, lot.tariff)
+        ticket.start_time = from_micros(start_us)
+        lot.open_tickets[ticket_id] = ticket
+
+    @classmethod
+    def _replay(cls, lot: ParkingLot, journal: bytes) -> int:
+        # Returns the offset just past the last complete record
+        offset = 0
+        while offset < len(journal):
+            kind = journal[offset]
+            if kind == cls.ASSIGN_KIND:
+                if offset + cls.ASSIGN.size > len(journal):
+                    break  # Torn final record from a crash mid-write
+                ticket_id, vehicle_id, vehicle_type, start_us, position, type_value, slot_index = cls.ASSIGN.unpack_from(journal, offset)[1:]
+                offset += cls.ASSIGN.size
+                vehicle = Vehicle(vehicle_id, VehicleType(vehicle_type))
+                floor = lot.floors_by_position[position]
+                # Free-lists are restored in order, so assign_slot must hand out the slot that was journaled
+                slot = floor.assign_slot(vehicle)
+                if slot is None or slot.parking_slot_type.value != type_value or slot.slot_index != slot_index:
+                    raise ValueError(f"Journal record for ticket {ticket_id} does not match the recovered lot.")
+                cls._open_ticket(lot, ticket_id, vehicle, slot, start_us)
+                lot.last_ticket_id = max(lot.last_ticket_id, ticket_id)
+            elif kind == cls.REMOVE_KIND:
+                if offset + cls.REMOVE.size > len(journal):
+                    break
+                ticket_id, end_us = cls.REMOVE.unpack_from(journal, offset)[1:]
+                offset += cls.REMOVE.size
+                ticket = lot.open_tickets.pop(ticket_id)
+                ticket.parking_slot.parking_floor.remove_slot(ticket.vehicle)
+            else:
+                raise ValueError(f"Unknown journal record kind {kind} at offset {offset}.")
+        return offset
+
+def measure_floor_memory(n_slots: int = 50_000):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    slots = [ParkingSlot(f"S{i}") for i in range(n_slots)]
+    after_slots = tracemalloc.take_snapshot()
+    floor = ParkingFloor("F0")
+    slot_types = list(ParkingSlotType)
+    for i, slot in enumerate(slots):
+        floor.add_parking_slots(slot, slot_types[i % len(slot_types)])
+    after_floor = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    slot_bytes = sum(stat.size_diff for stat in after_slots.compare_to(before, "filename"))
+    index_bytes = sum(stat.size_diff for stat in after_floor.compare_to(after_slots, "filename"))
+    free_list_bytes = sum(free_slots.__sizeof__() for free_slots in floor.free_slots.values())
+    print(f"{n_slots} slots: {slot_bytes / n_slots:.0f} B/slot for ParkingSlot objects, "
+          f"{index_bytes / n_slots:.1f} B/slot for the floor's slot lists and free-lists "
+          f"({free_list_bytes / n_slots:.1f} B/slot free-lists)")
+
+    vehicles = [Vehicle(i, VehicleType(i % len(VehicleType) + 1)) for i in range(n_slots)]
+    started = time.perf_counter()
+    for vehicle in vehicles:
+        floor.assign_slot(vehicle)
+    for vehicle in vehicles:
+        floor.remove_slot(vehicle)
+    elapsed = time.perf_counter() - started
+    print(f"{n_slots} slots: {2 * n_slots / elapsed:.0f} assign/remove operations/s")
+
+def benchmark_settlement(n_tickets: int = 100_000):
+    tariff = Tariff(DEFAULT_TARIFF.hourly_rates, default_rate=0.01, bands=[(8, 18, 1.5), (22, 6, 0.5)],
+                    daily_cap=1.0, grace_minutes=10)
+    slot_types = list(ParkingSlotType)
+    day = datetime(2024, 1, 1)
+    tickets = []
+    for i in range(n_tickets):
+        slot = ParkingSlot(f"S{i}")
+        slot.parking_slot_type = slot_types[i % len(slot_types)]
+        ticket = Ticket(i, None, slot, tariff)
+        ticket.start_time = day + timedelta(minutes=random.randrange(MINUTES_PER_DAY))
+        ticket.end_time = ticket.start_time + timedelta(minutes=random.randrange(3 * MINUTES_PER_DAY))
+        tickets.append(ticket)
+
+    started = time.perf_counter()
+    single = [ticket.calculate_price() for ticket in tickets]
+    per_ticket = time.perf_counter() - started
+    started = time.perf_counter()
+    batch = tariff.price_tickets(tickets)
+    batched = time.perf_counter() - started
+    assert single == batch
+    print(f"{n_tickets} tickets: calculate_price {n_tickets / per_ticket:.0f} tickets/s, "
+          f"price_tickets {n_tickets / batched:.0f} tickets/s")
+
+def lot_state(lot: ParkingLot):
+    return (lot.last_ticket_id,
+            sorted((ticket_id, ticket.vehicle.vehicle_id, ticket.parking_slot.parking_floor.parking_floor_name, ticket.parking_slot.name)
+                   for ticket_id, ticket in lot.open_tickets.items()),
+            {floor.parking_floor_name: {t: [slot.name for slot in free] for t, free in floor.free_slots.items()} for floor in lot.parking_floors})
+
+def benchmark_recovery(n_floors: int = 10, slots_per_floor: int = 10_000, n_events: int = 1_000_000, snapshot_every: int = 100_000):
+    with tempfile.TemporaryDirectory() as directory:
+        journal_path = os.path.join(directory, "lot.journal")
+        snapshot_path = os.path.join(directory, "lot.snapshot")
+        ParkingLot._instance = None
+        lot = ParkingLot("Benchmark")
+        slot_types = list(ParkingSlotType)
+        for f in range(n_floors):
+            floor = ParkingFloor(f"F{f}")
+            for s in range(slots_per_floor):
+                floor.add_parking_slots(ParkingSlot(f"F{f}S{s}"), slot_types[s % len(slot_types)])
+            lot.add_floor(floor)
+        journal = LotJournal(lot, journal_path, snapshot_path, snapshot_every=0)
+        journal.snapshot()
+        full_snapshot = snapshot_path + ".initial"
+        os.replace(snapshot_path, full_snapshot)
+        journal.snapshot_every = snapshot_every
+
+        # Keep the lot around half full: park while below the target, otherwise release a random ticket
+        vehicle_types = list(VehicleType)
+        target = n_floors * slots_per_floor // 2
+        open_ids = []
+        started = time.perf_counter()
+        for i in range(n_events):
+            if len(open_ids) < target and (not open_ids or random.random() < 0.5):
+                ticket = lot.get_parking_slot(Vehicle(i, random.choice(vehicle_types)))
+                if ticket:
+                    open_ids.append(ticket.ticket_id)
+                    continue
+            index = random.randrange(len(open_ids))
+            open_ids[index], open_ids[-1] = open_ids[-1], open_ids[index]
+            lot.remove_parking_slot(lot.open_tickets[open_ids.pop()])
+        logging_time = time.perf_counter() - started
+        journal.close()
+        expected = lot_state(lot)
+        journal_size = os.path.getsize(journal_path)
+
+        for name, path in (("snapshot + tail", snapshot_path), ("full replay", full_snapshot)):
+            started = time.perf_counter()
+            recovered = LotJournal.recover(journal_path, path, replace_existing=True, snapshot_every=0)
+            elapsed = time.perf_counter() - started
+            recovered.close()
+            assert lot_state(recovered.parking_lot) == expected
+            print(f"{n_floors * slots_per_floor} slots, {n_events} journal entries ({journal_size / n_events:.0f} B/entry, "
+                  f"logged at {n_events / logging_time:.0f} events/s): {name} recovery {elapsed:.2f}s")
+        ParkingLot._instance = None
+
+if __name__ == "__main__":
+    measure_floor_memory()
+    benchmark_settlement()
+    benchmark_recovery()
\ No newline at end of file